@@ -4,12 +4,16 @@ from delegation_planner.utils import SubtaskAllocDistribution
 from navigation_planner.utils import get_subtask_obj, get_subtask_action_obj, get_single_actions
 from utils.interact import interact
 from utils.utils import agent_settings
+from utils.log import get_logger
 
 from collections import defaultdict, namedtuple
 from itertools import permutations, product, combinations
 import scipy as sp
 import numpy as np
 import copy
+import logging
+
+log = get_logger('delegator')
 
 SubtaskAllocation = namedtuple("SubtaskAllocation", "subtask subtask_agent_names")
 
@@ -107,7 +111,7 @@ class BayesianDelegator(Delegator):
                 subtask=subtask,
                 subtask_agent_names=subtask_agent_names,
                 other_agent_planners={})
-        value = self.planner.v_l[(self.planner.cur_state.get_repr(), subtask)]
+        value = self.planner.v_l[(self.planner.cur_state.get_state_key(), subtask)]
         return value
 
     def prune_subtask_allocs(self, observation, subtask_alloc_probs):
@@ -135,7 +139,7 @@ class BayesianDelegator(Delegator):
 
     def set_priors(self, obs, incomplete_subtasks, priors_type):
         """Setting the prior probabilities for subtask allocations."""
-        print('{} setting priors'.format(self.agent_name))
+        log.info("%s setting priors", self.agent_name)
         self.incomplete_subtasks = incomplete_subtasks
 
         probs = self.get_subtask_alloc_probs()
@@ -233,7 +237,9 @@ class BayesianDelegator(Delegator):
             A float probability update of whether agents in subtask_agent_names are
             performing subtask.
         """
-        print("[BayesianDelgation.prob_nav_actions] Calculating probs for subtask {} by {}".format(str(subtask), ' & '.join(subtask_agent_names)))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("[BayesianDelgation.prob_nav_actions] Calculating probs for subtask %s by %s",
+                    subtask, ' & '.join(subtask_agent_names))
         assert len(subtask_agent_names) == 1 or len(subtask_agent_names) == 2
 
         # Perform inference over None subtasks.
@@ -266,7 +272,7 @@ class BayesianDelegator(Delegator):
                 value_f=self.planner.v_l)
 
         # Collect actions the agents could have taken in obs_tm1.
-        valid_nav_actions = self.planner.get_actions(state_repr=obs_tm1.get_repr())
+        valid_nav_actions = self.planner.get_actions(state_repr=obs_tm1.get_state_key())
 
         # Check action taken is in the list of actions available to agents in obs_tm1.
         assert action in valid_nav_actions, "valid_nav_actions: {}\nlocs: {}\naction: {}".format(
@@ -464,5 +470,5 @@ class BayesianDelegator(Delegator):
             self.probs.update(
                     subtask_alloc=subtask_alloc,
                     factor=update)
-            print("UPDATING: subtask_alloc {} by {}".format(subtask_alloc, update))
+            log.debug("UPDATING: subtask_alloc %s by %s", subtask_alloc, update)
         self.probs.normalize()
@@ -3,6 +3,9 @@ import numpy as np
 import scipy as sp
 import random
 from utils.utils import agent_settings
+from utils.log import get_logger
+
+log = get_logger('delegator')
 
 
 class SubtaskAllocDistribution():
@@ -14,7 +17,7 @@ class SubtaskAllocDistribution():
         if len(subtask_allocs) == 0:
             return
         prior = 1./(len(subtask_allocs))
-        print('set prior', prior)
+        log.debug("set prior %s", prior)
 
         for subtask_alloc in subtask_allocs:
             self.probs[tuple(subtask_alloc)] = prior
@@ -77,7 +80,7 @@ class SubtaskAllocDistribution():
         try:
             del self.probs[tuple(subtask_alloc)]
         except:
-            print('subtask_alloc {} not found in probsdict'.format(subtask_alloc))
+            log.debug("subtask_alloc %s not found in probsdict", subtask_alloc)
 
     def normalize(self):
         total = sum(self.probs.values())
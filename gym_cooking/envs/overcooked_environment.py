@@ -8,19 +8,26 @@ from delegation_planner.bayesian_delegator import BayesianDelegator
 
 # Navigation planning
 import navigation_planner.utils as nav_utils
+from navigation_planner.utils import ReachabilityGraph
 
 # Other core modules
 from utils.interact import interact
-from utils.world import World
+import utils.level_cache as level_cache
+import utils.encoding as encoding
+from utils.grid_tensor import GridTensor, channel_names
+from utils.world import World, zobrist, ZOBRIST_MASK
 from utils.core import *
 from utils.agent import SimAgent
-from misc.game.gameimage import GameImage
+from misc.game.compositor import TileCompositor
+from misc.game.sprites import TILE_SCALE
 from utils.agent import COLORS
+from utils.utils import get_model_types, resolve_collisions
+from utils.log import get_logger
 
 import copy
-import networkx as nx
+import logging
+import weakref
 import numpy as np
-from itertools import combinations, permutations, product
 from collections import namedtuple
 
 import gym
@@ -28,19 +35,99 @@ from gym import error, spaces, utils
 from gym.utils import seeding
 
 
+log = get_logger('env')
+
 CollisionRepr = namedtuple("CollisionRepr", "time agent_names agent_locations")
+# Actions, in the order indices into action_space refer to.
+ACTIONS = World.NAV_ACTIONS + [(0, 0)]
+ACTION_INDEX = {action: i for i, action in enumerate(ACTIONS)}
+
+# Picklable state saved by get_state: the world and agents as a
+# utils.encoding array, and the active orders as indices into env.recipes.
+EnvState = namedtuple("EnvState", "encoding orders t score")
+
+
+class Observation:
+    """Read-only view of an OvercookedEnvironment's state at one timestep.
+
+    Attribute reads go straight to the environment, so making and reading an
+    observation copies nothing. Before the environment next changes state
+    (`step`, `reset` or `set_state`), every observation still referenced is
+    materialized into a copy-on-write snapshot of the state it showed. Use
+    copy.copy(obs) for an environment that can be modified.
+
+    Only the observation itself is read-only: what it returns (obs.world,
+    obs.sim_agents, their gridsquares and objects) are the environment's own
+    objects, not copies. Do not modify them, and read them through the
+    observation again after the environment steps instead of keeping them:
+    a world or agent read before the step is the live one, which has moved
+    on, while the observation now shows its snapshot.
+    """
+
+    __slots__ = ('_env', '__weakref__')
+
+    def __init__(self, env):
+        object.__setattr__(self, '_env', env)
+
+    def __getattr__(self, name):
+        return getattr(self._env, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Observations are read-only; use copy.copy(obs) for a modifiable environment")
+
+    def __delattr__(self, name):
+        raise AttributeError("Observations are read-only; use copy.copy(obs) for a modifiable environment")
+
+    def __copy__(self):
+        return copy.copy(self._env)
+
+    def __str__(self):
+        return str(self._env)
+
+    def __eq__(self, other):
+        return self.get_state_key() == other.get_state_key()
+
+    def materialize(self):
+        """Detach this observation from its environment."""
+        object.__setattr__(self, '_env', self._env.snapshot())
 
 
 class OvercookedEnvironment(gym.Env):
     """Environment object for Overcooked."""
 
+    # Level-derived initial state, per level, that later resets clone (see
+    # save_prototype).
+    prototypes = {}
+    # Per level, the TileCompositor drawing image observations without a
+    # GameImage (see get_image_obs).
+    compositors = {}
+
     def __init__(self, arglist):
         self.arglist = arglist
         self.t = 0
         self.set_filename()
+        # Hash of the level file (see level_cache.level_key), computed once
+        # rather than on every reset.
+        self.level_key = level_cache.level_key(arglist.level, arglist.max_num_subtasks)
+
+        # Weak references to the observations reading this environment's state.
+        self.observations = []
+        self.obs_tm1 = None
+        # Kept up to date incrementally for --obs-mode tensor (see get_tensor_obs).
+        self.grid_tensor = None
+        # Output arrays and info dict overwritten by every step with
+        # --reuse-buffers (see get_buffer). Copies allocate their own.
+        self.buffers = None
+
+        # One index into ACTIONS per agent. The other spaces depend on the
+        # level and are set on reset (see make_spaces).
+        self.action_space = spaces.MultiDiscrete([len(ACTIONS)] * arglist.num_agents)
+        self.image_observation_space = None
+        self.action_mask_space = None
 
         # For visualizing episode.
         self.rep = []
+        self.agent_cells = []
 
         # For tracking data during an episode.
         self.collisions = []
@@ -51,20 +138,36 @@ class OvercookedEnvironment(gym.Env):
     def get_repr(self):
         return self.world.get_repr() + tuple([agent.get_repr() for agent in self.sim_agents])
 
+    def get_state_key(self):
+        """Return a 64-bit key identifying the state described by get_repr.
+
+        The objects' part is maintained incrementally by the world as
+        interact mutates it, so this is O(num_agents) rather than a rebuild
+        of the repr. Use it instead of get_repr to key dictionaries."""
+        key = self.world.state_hash
+        for agent in self.sim_agents:
+            key += zobrist(agent.get_repr())
+        return key & ZOBRIST_MASK
+
     def __str__(self):
         # Print the world and agents.
         _display = list(map(lambda x: ''.join(map(lambda y: y + ' ', x)), self.rep))
         return '\n'.join(_display)
 
     def __eq__(self, other):
-        return self.get_repr() == other.get_repr()
+        return self.get_state_key() == other.get_state_key()
 
     def __copy__(self):
+        if self.arglist.snapshot_copies:
+            return self.snapshot()
+
         new_env = OvercookedEnvironment(self.arglist)
         new_env.__dict__ = self.__dict__.copy()
         new_env.world = copy.copy(self.world)
-        new_env.sim_agents = [copy.copy(a) for a in self.sim_agents]
         new_env.distances = self.distances
+        new_env.observations = []
+        new_env.buffers = None
+        new_env.sim_agents = [copy.copy(a) for a in self.sim_agents]
 
         # Make sure new objects and new agents' holdings have the right pointers.
         for a in new_env.sim_agents:
@@ -75,24 +178,158 @@ class OvercookedEnvironment(gym.Env):
                         find_held_objects=True)
         return new_env
 
+    def snapshot(self):
+        """Return a copy-on-write copy of this environment (see World.snapshot)."""
+        new_env = OvercookedEnvironment(self.arglist)
+        new_env.__dict__ = self.__dict__.copy()
+        new_env.world = self.world.snapshot()
+        new_env.observations = []
+        new_env.buffers = None
+
+        # Snapshot worlds share held objects, so agents can keep their pointers.
+        new_env.sim_agents = []
+        for a in self.sim_agents:
+            new_agent = SimAgent(name=a.name, id_color=a.color, location=a.location)
+            new_agent.__dict__ = a.__dict__.copy()
+            new_env.sim_agents.append(new_agent)
+        return new_env
+
+    def get_state(self):
+        """Return an EnvState of the agents, objects, active orders, time and
+        score, for set_state to come back to. It holds no references into
+        this environment and pickles to a few hundred bytes."""
+        orders = tuple(next(i for i, r in enumerate(self.recipes) if r is recipe)
+                       for recipe in self.world.active_orders)
+        return EnvState(encoding=encoding.encode(self), orders=orders,
+                        t=self.t, score=self.score)
+
+    def set_state(self, state):
+        """Restore an EnvState from get_state of this environment (or one of
+        the same level and agents), in place.
+
+        Only the objects are rebuilt; gridsquares, agents, recipes and
+        distances stay, so branching and rolling back this way is much
+        cheaper than copy.copy(env)."""
+        self.obs_tm1 = None
+        self.materialize_observations()
+        encoding.restore(self, state.encoding)
+        self.world.active_orders = [self.recipes[i] for i in state.orders]
+        self.t = state.t
+        self.score = state.score
+        # Forget collisions from the future we rolled back from.
+        self.collisions = [c for c in self.collisions if c.time <= self.t]
+        self.done()  # refreshes successful and termination_info
+
+    @property
+    def obs_tm1(self):
+        """Observation of the state step() acted on (after collisions were
+        resolved, before the agents moved), or as set.
+
+        step() only keeps that state's compact EnvState (see get_state), so
+        stepping copies no world; the observation is built from it the first
+        time this is read. Like set_state, that rebuilds the objects: it
+        equals the state step() acted on (same get_state_key), but holds new
+        objects, listed in world.objects in encoding order."""
+        if self._obs_tm1 is None and self._state_tm1 is not None:
+            env = self.snapshot()
+            env.set_state(self._state_tm1)
+            self._obs_tm1 = Observation(env)
+        return self._obs_tm1
+
+    @obs_tm1.setter
+    def obs_tm1(self, obs):
+        self._obs_tm1 = obs
+        self._state_tm1 = None
+
+    def observe(self):
+        """Return an Observation of the current state."""
+        obs = Observation(self)
+        self.observations.append(weakref.ref(obs))
+        return obs
+
+    def get_tensor_obs(self, out=None):
+        """Return the (channels, height, width) grid tensor of the current
+        state (see utils.grid_tensor), as a new array or written into out."""
+        if self.grid_tensor is None or self.grid_tensor.world is not self.world:
+            self.grid_tensor = GridTensor(self)
+        if out is None:
+            return self.grid_tensor.update().copy()
+        np.copyto(out, self.grid_tensor.update())
+        return out
+
+    def get_image_obs(self, out=None):
+        """Return the (height, width, 3) uint8 RGB image of the current state,
+        as a new array or written into out. Drawn by the GameImage that
+        records the episode with --record, else by the level's
+        TileCompositor, which needs no pygame."""
+        if hasattr(self, 'game'):
+            return self.game.get_image_obs(out=out)
+        return self.get_compositor().render(self, out=out)
+
+    def get_compositor(self):
+        """Return this process's TileCompositor of the level."""
+        key = self.prototype_key()
+        compositor = OvercookedEnvironment.compositors.get(key)
+        if compositor is None:
+            compositor = OvercookedEnvironment.compositors[key] = TileCompositor(self)
+        return compositor
+
+    def get_action_mask(self, out=None):
+        """Return a (num_agents, len(ACTIONS)) bool array of the actions
+        each agent can usefully take (see nav_utils.get_single_actions)."""
+        if out is None:
+            out = np.zeros((len(self.sim_agents), len(ACTIONS)), dtype=bool)
+        else:
+            out[...] = False
+        for i, agent in enumerate(self.sim_agents):
+            for action in nav_utils.get_single_actions(env=self, agent=agent):
+                out[i, ACTION_INDEX[action]] = True
+        return out
+
+    def get_buffer(self, name, shape, dtype):
+        """Return this environment's reusable output array called name,
+        allocating it the first time (see --reuse-buffers)."""
+        if self.buffers is None:
+            self.buffers = {}
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            buffer = self.buffers[name] = np.zeros(shape, dtype=dtype)
+        return buffer
+
+    def make_obs(self):
+        """Return the observation reset() and step() hand out, as chosen by
+        --obs-mode: an Observation of this environment or its grid tensor."""
+        if self.arglist.obs_mode != "tensor":
+            return self.observe()
+        if self.arglist.reuse_buffers:
+            return self.get_tensor_obs(out=self.get_buffer("obs", self.observation_space.shape, np.uint8))
+        return self.get_tensor_obs()
+
+    def materialize_observations(self):
+        """Materialize the observations still referenced, before this
+        environment's state changes under them."""
+        for ref in self.observations:
+            obs = ref()
+            if obs is not None:
+                obs.materialize()
+        self.observations = []
+
     def set_filename(self):
         self.filename = "{}_agents{}_seed{}".format(self.arglist.level,\
             self.arglist.num_agents, self.arglist.seed)
         model = ""
-        if self.arglist.model1 is not None:
-            model += "_model1-{}".format(self.arglist.model1)
-        if self.arglist.model2 is not None:
-            model += "_model2-{}".format(self.arglist.model2)
-        if self.arglist.model3 is not None:
-            model += "_model3-{}".format(self.arglist.model3)
-        if self.arglist.model4 is not None:
-            model += "_model4-{}".format(self.arglist.model4)
+        for i, model_type in enumerate(get_model_types(self.arglist)):
+            if model_type is not None:
+                model += "_model{}-{}".format(i+1, model_type)
         self.filename += model
 
     def load_level(self, level, num_agents):
-        x = 0
-        y = 0
-        with open('utils/levels/{}.txt'.format(level), 'r') as file:
+        self.build_level(*self.read_level(level), num_agents=num_agents)
+
+    def read_level(self, level):
+        """Parse a level file into (map rows, recipe names, agent locations)."""
+        rows, recipe_names, agent_locations = [], [], []
+        with open(level_cache.level_path(level), 'r') as file:
             # Mark the phases of reading.
             phase = 1
             for line in file:
@@ -102,59 +339,138 @@ class OvercookedEnvironment(gym.Env):
 
                 # Phase 1: Read in kitchen map.
                 elif phase == 1:
-                    for x, rep in enumerate(line):
-                        # FoodSpawner, i.e. Tomato, Lettuce, or Onion.
-                        if rep in 'TLO':
-                            obj = Object(
-                                    location=(x, y),
-                                    contents=RepToClass[rep.lower()]())
-                            spawner = FoodSpawner(
-                                        object=obj,
-                                        rep=rep,
-                                        location=(x, y))
-                            spawner.acquire(obj=obj)
-                            self.world.insert(obj=spawner)
-                            self.world.insert(obj=obj)
-                        # Object, i.e. Tomato, Lettuce, Onion or Plate.
-                        elif rep in 'tlop':
-                            counter = Counter(location=(x, y))
-                            obj = Object(
-                                    location=(x, y),
-                                    contents=RepToClass[rep]())
-                            counter.acquire(obj=obj)
-                            self.world.insert(obj=counter)
-                            self.world.insert(obj=obj)
-                        # GridSquare, i.e. Floor, Counter, Cutboard, Delivery, Trash.
-                        elif rep in RepToClass:
-                            newobj = RepToClass[rep]((x, y))
-                            self.world.objects.setdefault(newobj.name, []).append(newobj)
-                        else:
-                            # Empty. Set a Floor tile.
-                            f = Floor(location=(x, y))
-                            self.world.objects.setdefault('Floor', []).append(f)
-                    y += 1
+                    rows.append(line)
                 # Phase 2: Read in recipe list.
                 elif phase == 2:
-                    self.recipes.append(globals()[line]())
-
-                # Phase 3: Read in agent locations (up to num_agents).
+                    recipe_names.append(line)
+                # Phase 3: Read in agent locations.
                 elif phase == 3:
-                    if len(self.sim_agents) < num_agents:
-                        loc = line.split(' ')
-                        sim_agent = SimAgent(
-                                name='agent-'+str(len(self.sim_agents)+1),
-                                id_color=COLORS[len(self.sim_agents)],
-                                location=(int(loc[0]), int(loc[1])))
-                        self.sim_agents.append(sim_agent)
+                    loc = line.split(' ')
+                    agent_locations.append((int(loc[0]), int(loc[1])))
+        return rows, recipe_names, agent_locations
+
+    def build_level(self, rows, recipe_names, agent_locations, num_agents):
+        """Populate the world, recipes and agents (up to num_agents) from a parsed level."""
+        for y, line in enumerate(rows):
+            for x, rep in enumerate(line):
+                # FoodSpawner, i.e. Tomato, Lettuce, or Onion.
+                if rep in 'TLO':
+                    obj = Object(
+                            location=(x, y),
+                            contents=RepToClass[rep.lower()]())
+                    spawner = FoodSpawner(
+                                object=obj,
+                                rep=rep,
+                                location=(x, y))
+                    spawner.acquire(obj=obj)
+                    self.world.insert(obj=spawner)
+                    self.world.insert(obj=obj)
+                # Object, i.e. Tomato, Lettuce, Onion or Plate.
+                elif rep in 'tlop':
+                    counter = Counter(location=(x, y))
+                    obj = Object(
+                            location=(x, y),
+                            contents=RepToClass[rep]())
+                    counter.acquire(obj=obj)
+                    self.world.insert(obj=counter)
+                    self.world.insert(obj=obj)
+                # GridSquare, i.e. Floor, Counter, Cutboard, Delivery, Trash.
+                elif rep in RepToClass:
+                    newobj = RepToClass[rep]((x, y))
+                    self.world.insert(obj=newobj)
+                else:
+                    # Empty. Set a Floor tile.
+                    f = Floor(location=(x, y))
+                    self.world.insert(obj=f)
+
+        for name in recipe_names:
+            self.recipes.append(globals()[name]())
+
+        # Agents beyond the level's listed spawns start on the remaining
+        # floor tiles, in reading order.
+        agent_locations = [tuple(location) for location in agent_locations[:num_agents]]
+        if len(agent_locations) < num_agents:
+            floors = [(x, y) for y, line in enumerate(rows) for x, rep in enumerate(line)
+                      if rep not in 'TLOtlop' and RepToClass.get(rep, Floor) is Floor]
+            agent_locations += [location for location in floors
+                                if location not in agent_locations][:num_agents - len(agent_locations)]
+        for location in agent_locations:
+            sim_agent = SimAgent(
+                    name='agent-'+str(len(self.sim_agents)+1),
+                    id_color=COLORS[len(self.sim_agents) % len(COLORS)],
+                    location=location)
+            self.sim_agents.append(sim_agent)
 
         self.distances = {}
-        self.world.width = x+1
-        self.world.height = y
+        self.world.width = len(rows[-1])
+        self.world.height = len(rows)
         self.world.perimeter = 2*(self.world.width + self.world.height)
         self.world.active_orders = copy.copy(self.recipes)
 
+    def load_compiled_level(self, compiled):
+        """Reset from a compiled level (see utils/level_cache.py) instead of
+        parsing it and recomputing subtasks, reachability and distances."""
+        self.build_level(
+                rows=compiled["rows"].tolist(),
+                recipe_names=compiled["recipes"].tolist(),
+                agent_locations=compiled["agent_locations"].tolist(),
+                num_agents=self.arglist.num_agents)
+        actions = {str(a): a for r in self.recipes for a in r.actions}
+        self.all_subtasks = [actions[name] for name in compiled["subtasks"].tolist()]
+        self.world.make_loc_to_gridsquare()
+        self.world.reachability_graph = ReachabilityGraph.from_arrays(
+                collidable=compiled["collidable"],
+                slot_ids=compiled["slot_ids"],
+                indptr=compiled["indptr"],
+                indices=compiled["indices"],
+                nav_actions=World.NAV_ACTIONS)
+        self.world.make_distances(
+                locations=[tuple(loc) for loc in compiled["locations"].tolist()])
+        self.distances = self.world.distances
+
+    def prototype_key(self):
+        return (self.level_key, self.arglist.num_agents)
+
+    def save_prototype(self):
+        """Keep this freshly reset env's initial state for later resets of
+        the same level. The world is kept as a snapshot (see World.snapshot),
+        so this episode's changes do not reach it."""
+        OvercookedEnvironment.prototypes[self.prototype_key()] = {
+                "world": self.world.snapshot(),
+                "recipes": self.recipes,
+                "sim_agents": [(agent.name, agent.color, agent.location) for agent in self.sim_agents],
+                "all_subtasks": self.all_subtasks}
+
+    def load_prototype(self, prototype):
+        """Reset from a prototype: the recipes, subtasks, reachability graph
+        and distances are shared, and the world's gridsquares and objects are
+        shared copy-on-write."""
+        self.world = prototype["world"].snapshot()
+        self.world.arglist = self.arglist
+        self.recipes = list(prototype["recipes"])
+        self.world.active_orders = copy.copy(self.recipes)
+        self.sim_agents = [SimAgent(name=name, id_color=color, location=location)
+                           for name, color, location in prototype["sim_agents"]]
+        self.all_subtasks = prototype["all_subtasks"]
+        self.distances = self.world.distances
+
+    def compile_level(self):
+        """Return the arrays load_compiled_level needs, from a freshly reset env."""
+        rows, recipe_names, agent_locations = self.read_level(self.arglist.level)
+        graph = self.world.reachability_graph
+        return {"rows": np.array(rows),
+                "recipes": np.array(recipe_names),
+                "agent_locations": np.array(agent_locations, dtype=int).reshape(-1, 2),
+                "subtasks": np.array([str(subtask) for subtask in self.all_subtasks]),
+                "collidable": graph.collidable,
+                "slot_ids": graph.slot_ids,
+                "indptr": graph.indptr,
+                "indices": graph.indices,
+                "locations": np.array(self.distances.locations, dtype=int).reshape(-1, 2)}
 
     def reset(self):
+        self.obs_tm1 = None
+        self.materialize_observations()
         self.world = World(arglist=self.arglist)
         self.recipes = []
         self.sim_agents = []
@@ -163,6 +479,7 @@ class OvercookedEnvironment(gym.Env):
 
         # For visualizing episode.
         self.rep = []
+        self.agent_cells = []
 
         # For tracking data during an episode.
         self.collisions = []
@@ -170,72 +487,145 @@ class OvercookedEnvironment(gym.Env):
         self.successful = False
         self.score = 0
 
-        # Load world & distances.
-        self.load_level(
-                level=self.arglist.level,
-                num_agents=self.arglist.num_agents)
-        self.all_subtasks = self.run_recipes()
-        self.world.make_loc_to_gridsquare()
-        self.world.make_reachability_graph()
-        self.cache_distances()
-        self.obs_tm1 = copy.copy(self)
+        # Load world & distances: from this process's earlier resets of the
+        # level, else from the compiled level if there is one.
+        self.world.lower_bound_cache.resize(self.arglist.lower_bound_cache_size)
+        prototype = OvercookedEnvironment.prototypes.get(self.prototype_key())
+        compiled = None
+        if prototype is None and self.arglist.level_cache is not None:
+            compiled = level_cache.load(
+                    self.arglist.level_cache, self.arglist.level, self.arglist.max_num_subtasks)
+        if prototype is not None:
+            self.load_prototype(prototype)
+        elif compiled is not None:
+            self.load_compiled_level(compiled)
+        else:
+            self.load_level(
+                    level=self.arglist.level,
+                    num_agents=self.arglist.num_agents)
+            self.all_subtasks = self.run_recipes()
+            self.world.make_loc_to_gridsquare()
+            self.world.make_reachability_graph()
+            self.cache_distances()
+            if self.arglist.level_cache is not None:
+                level_cache.save(self.arglist.level_cache, self.arglist.level,
+                        self.arglist.max_num_subtasks, self.compile_level())
+        if prototype is None:
+            self.save_prototype()
+        self.obs_tm1 = self.observe()
 
-        if self.arglist.record or self.arglist.with_image_obs:
+        if self.arglist.record:
+            # Imported here: only recording needs pygame.
+            from misc.game.gameimage import GameImage
+            self.close()  # finish the previous episode's recording
             self.game = GameImage(
                     filename=self.filename,
                     world=self.world,
                     sim_agents=self.sim_agents,
-                    record=self.arglist.record)
+                    record=self.arglist.record,
+                    record_format=self.arglist.record_format)
             self.game.on_init()
-            if self.arglist.record:
-                self.game.save_image_obs(self.t)
+            self.game.save_image_obs(self.t)
 
-        return copy.copy(self)
+        self.make_spaces()
+        return self.make_obs()
+
+    def make_spaces(self):
+        """Set the spaces of what step() returns for the current level:
+        observation_space (the grid tensor's, with --obs-mode tensor, else
+        None), image_observation_space (info['image_obs'], with
+        --with-image-obs or --record, else None) and action_mask_space
+        (info['action_mask'])."""
+        self.observation_space = None
+        if self.arglist.obs_mode == "tensor":
+            shape = (len(channel_names(len(self.sim_agents))), self.world.height, self.world.width)
+            self.observation_space = spaces.Box(
+                    low=0, high=np.iinfo(np.uint8).max, shape=shape, dtype=np.uint8)
+        self.image_observation_space = None
+        if self.arglist.record or self.arglist.with_image_obs:
+            shape = (TILE_SCALE * self.world.height, TILE_SCALE * self.world.width, 3)
+            self.image_observation_space = spaces.Box(
+                    low=0, high=np.iinfo(np.uint8).max, shape=shape, dtype=np.uint8)
+        self.action_mask_space = spaces.Box(
+                low=0, high=1, shape=(len(self.sim_agents), len(ACTIONS)), dtype=bool)
 
     def close(self):
-        return
+        if hasattr(self, 'game'):
+            self.game.close_recording()
 
     def step(self, action_dict):
+        # Observations kept since the last step need their own state now.
+        self.obs_tm1 = None
+        self.materialize_observations()
+
         # Track internal environment info.
         self.t += 1
-        step_str = "[environment.step] @ TIMESTEP {} | SCORE: {} | ORDERS: {}".format(self.t, self.score, [str(r) for r in self.world.active_orders])
-        print("="*len(step_str))
-        print(step_str)
-        print("="*len(step_str))
+        if log.isEnabledFor(logging.INFO):
+            log.info("[environment.step] @ TIMESTEP %d | SCORE: %s | ORDERS: %s",
+                    self.t, self.score, [str(r) for r in self.world.active_orders])
 
-        # Get actions.
+        # Get actions, given by agent name or as indices into ACTIONS.
+        if not isinstance(action_dict, dict):
+            action_dict = {agent.name: ACTIONS[a] for agent, a in zip(self.sim_agents, action_dict)}
         for sim_agent in self.sim_agents:
             sim_agent.action = action_dict[sim_agent.name]
 
         # Check collisions.
         self.check_collisions()
-        self.obs_tm1 = copy.copy(self)
+        # obs_tm1 is built from this state only if it is read.
+        self.obs_tm1 = None
+        self._state_tm1 = self.get_state()
 
         # Execute.
         self.execute_navigation()
 
         # Visualize.
-        self.display()
-        self.print_agents()
+        if not self.arglist.no_display:
+            self.display()
+            self.print_agents()
         if self.arglist.record:
             self.game.save_image_obs(self.t)
 
-        # Get a plan-representation observation.
-        new_obs = copy.copy(self)
+        # Get a plan-representation (or grid tensor) observation.
+        new_obs = self.make_obs()
         # Get an image observation
         image_obs = None
-        if hasattr(self, 'game'):
-            image_obs = self.game.get_image_obs()
+        if self.arglist.record or self.arglist.with_image_obs:
+            out = None
+            if self.arglist.reuse_buffers:
+                out = self.get_buffer("image_obs", self.image_observation_space.shape, np.uint8)
+            image_obs = self.get_image_obs(out=out)
 
         done = self.done()
         if done:
-            print(self.termination_info)
+            log.info("%s", self.termination_info)
         reward = self.reward()
+        if self.arglist.reuse_buffers:
+            return self.fill_step_buffers(new_obs, image_obs, reward, done)
         info = {"t": self.t, "obs": new_obs,
                 "image_obs": image_obs,
                 "done": done, "termination_info": self.termination_info}
         return new_obs, reward, done, info
 
+    def fill_step_buffers(self, obs, image_obs, reward, done):
+        """Write a step's results into this environment's buffers and return
+        them: reward and done as 0-d arrays, and the same info dict every
+        step, which also holds the agents' action mask."""
+        reward_buffer = self.get_buffer("reward", (), np.float64)
+        reward_buffer[()] = reward
+        done_buffer = self.get_buffer("done", (), bool)
+        done_buffer[()] = done
+        action_mask = self.get_action_mask(
+                out=self.get_buffer("action_mask", self.action_mask_space.shape, bool))
+        info = self.buffers.setdefault("info", {})
+        info["t"] = self.t
+        info["obs"] = obs
+        info["image_obs"] = image_obs
+        info["action_mask"] = action_mask
+        info["done"] = done_buffer
+        info["termination_info"] = self.termination_info
+        return obs, reward_buffer, done_buffer, info
+
 
     def done(self):
         # Done if the episode maxes out
@@ -271,10 +661,15 @@ class OvercookedEnvironment(gym.Env):
         print(str(self))
 
     def update_display(self):
+        # Agents are drawn over the world's rep, so have the world redraw
+        # the cells they were drawn on last time.
+        for location in self.agent_cells:
+            self.world.mark_dirty(location)
         self.rep = self.world.update_display()
         for agent in self.sim_agents:
             x, y = agent.location
             self.rep[y][x] = str(agent)
+        self.agent_cells = [agent.location for agent in self.sim_agents]
 
 
     def get_agent_names(self):
@@ -375,73 +770,39 @@ class OvercookedEnvironment(gym.Env):
         """Returns whether agents are colliding.
 
         Collisions happens if agent collide amongst themselves or with world objects."""
-        # Tracks whether agents can execute their action.
-        execute = [True, True]
-
-        # Collision between agents and world objects.
-        agent1_next_loc = tuple(np.asarray(agent1_loc) + np.asarray(agent1_action))
-        if self.world.get_gridsquare_at(location=agent1_next_loc).collidable:
-            # Revert back because agent collided.
-            agent1_next_loc = agent1_loc
-
-        agent2_next_loc = tuple(np.asarray(agent2_loc) + np.asarray(agent2_action))
-        if self.world.get_gridsquare_at(location=agent2_next_loc).collidable:
-            # Revert back because agent collided.
-            agent2_next_loc = agent2_loc
-
-        # Inter-agent collision.
-        if agent1_next_loc == agent2_next_loc:
-            if agent1_next_loc == agent1_loc and agent1_action != (0, 0):
-                execute[1] = False
-            elif agent2_next_loc == agent2_loc and agent2_action != (0, 0):
-                execute[0] = False
-            else:
-                execute[0] = False
-                execute[1] = False
-
-        # Prevent agents from swapping places.
-        elif ((agent1_loc == agent2_next_loc) and
-                (agent2_loc == agent1_next_loc)):
-            execute[0] = False
-            execute[1] = False
+        execute, _ = resolve_collisions(
+                [agent1_loc, agent2_loc], [agent1_action, agent2_action],
+                self.world.is_collidable)
         return execute
 
     def check_collisions(self):
         """Checks for collisions and corrects agents' executable actions.
 
-        Collisions can either happen amongst agents or between agents and world objects."""
-        execute = [True for _ in self.sim_agents]
+        Collisions can either happen amongst agents or between agents and world objects.
+        All agents' moves are resolved together, see `resolve_collisions`."""
+        execute, collisions = resolve_collisions(
+                [agent.location for agent in self.sim_agents],
+                [agent.action for agent in self.sim_agents],
+                self.world.is_collidable)
 
-        # Check each pairwise collision between agents.
-        for i, j in combinations(range(len(self.sim_agents)), 2):
+        # Track collisions.
+        for i, j in collisions:
             agent_i, agent_j = self.sim_agents[i], self.sim_agents[j]
-            exec_ = self.is_collision(
-                    agent1_loc=agent_i.location,
-                    agent2_loc=agent_j.location,
-                    agent1_action=agent_i.action,
-                    agent2_action=agent_j.action)
-
-            # Update exec array and set path to do nothing.
-            if not exec_[0]:
-                execute[i] = False
-            if not exec_[1]:
-                execute[j] = False
-
-            # Track collisions.
-            if not all(exec_):
-                collision = CollisionRepr(
-                        time=self.t,
-                        agent_names=[agent_i.name, agent_j.name],
-                        agent_locations=[agent_i.location, agent_j.location])
-                self.collisions.append(collision)
-
-        print('\nexecute array is:', execute)
+            collision = CollisionRepr(
+                    time=self.t,
+                    agent_names=[agent_i.name, agent_j.name],
+                    agent_locations=[agent_i.location, agent_j.location])
+            self.collisions.append(collision)
+
+        log.debug("execute array is: %s", execute)
 
         # Update agents' actions if collision was detected.
         for i, agent in enumerate(self.sim_agents):
             if not execute[i]:
                 agent.action = (0, 0)
-            print("{} has action {}".format(color(agent.name, agent.color), agent.action))
+        if log.isEnabledFor(logging.DEBUG):
+            for agent in self.sim_agents:
+                log.debug("%s has action %s", color(agent.name, agent.color), agent.action)
 
     def execute_navigation(self):
         active_orders = copy.copy(self.world.active_orders)
@@ -455,36 +816,13 @@ class OvercookedEnvironment(gym.Env):
     def cache_distances(self):
         """Saving distances between world objects."""
         counter_grid_names = [name for name in self.world.objects if "Supply" in name or "Counter" in name or "Delivery" in name or "Trash" in name or "Cut" in name]
-        # Getting all source objects.
+        # Getting all source (and destination) objects.
         source_objs = copy.copy(self.world.objects["Floor"])
         for name in counter_grid_names:
             source_objs += copy.copy(self.world.objects[name])
-        # Getting all destination objects.
-        dest_objs = source_objs
-
-        # From every source (Counter and Floor objects),
-        # calculate distance to other nodes.
-        for source in source_objs:
-            self.distances[source.location] = {}
-            # Source to source distance is 0.
-            self.distances[source.location][source.location] = 0
-            for destination in dest_objs:
-                # Possible edges to approach source and destination.
-                source_edges = [(0, 0)] if not source.collidable else World.NAV_ACTIONS
-                destination_edges = [(0, 0)] if not destination.collidable else World.NAV_ACTIONS
-                # Maintain shortest distance.
-                shortest_dist = np.inf
-                for source_edge, dest_edge in product(source_edges, destination_edges):
-                    try:
-                        dist = nx.shortest_path_length(self.world.reachability_graph, (source.location,source_edge), (destination.location, dest_edge))
-                        # Update shortest distance.
-                        if dist < shortest_dist:
-                            shortest_dist = dist
-                    except:
-                        continue
-                # Cache distance floor -> counter.
-                self.distances[source.location][destination.location] = shortest_dist
-
-        # Save all distances under world as well.
-        self.world.distances = self.distances
 
+        # Distances from every source (Counter and Floor objects) to every
+        # other one, computed by a BFS over the reachability graph per
+        # source as they are queried.
+        self.world.make_distances(locations=[source.location for source in source_objs])
+        self.distances = self.world.distances
@@ -0,0 +1,157 @@
+"""Vector of OvercookedEnvironments running in worker processes.
+
+`SubprocVecOvercookedEnvironment` spreads `num_envs` full object-level
+environments over `num_workers` processes. Each worker steps its share of
+the environments and writes their array observations (by default their
+images, drawn by the worker's `TileCompositor` without pygame) straight into
+one `multiprocessing.shared_memory` block, which the parent exposes as a
+single (num_envs, ...) array without copying. Actions and the small per-step results go over one pipe per worker,
+batched per worker.
+"""
+import copy
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+from envs.overcooked_environment import OvercookedEnvironment
+
+
+def _make_env(arglist):
+    env = OvercookedEnvironment(arglist)
+    env.reset()
+    return env
+
+def _observe(env, observation_fn, out=None):
+    if observation_fn is None:
+        return env.get_image_obs(out=out)
+    if out is None:
+        return np.asarray(observation_fn(env))
+    out[...] = observation_fn(env)
+    return out
+
+def _observe_all(envs, observation_fn, out):
+    if observation_fn is None:
+        # One batch, drawn by the compositor the envs of the level share.
+        envs[0].get_compositor().render_batch(envs, out=out)
+    else:
+        for env, obs in zip(envs, out):
+            _observe(env, observation_fn, obs)
+
+def _worker(remote, parent_remote, arglist, shm, shape, dtype, start, stop, observation_fn):
+    parent_remote.close()
+    envs = [_make_env(arglist) for _ in range(start, stop)]
+    obs = np.ndarray(shape, dtype=dtype, buffer=shm.buf)[start:stop]
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                results = []
+                for env, action_dict in zip(envs, data):
+                    _, reward, done, info = env.step(action_dict)
+                    del info['obs'], info['image_obs']
+                    info['successful'] = env.successful
+                    if done:
+                        env.reset()
+                    results.append((reward, done, info))
+                _observe_all(envs, observation_fn, obs)
+                remote.send(results)
+            elif cmd == 'reset':
+                for env in envs:
+                    env.reset()
+                _observe_all(envs, observation_fn, obs)
+                remote.send(None)
+            elif cmd == 'close':
+                break
+            else:
+                raise ValueError("Unknown command {}".format(cmd))
+    finally:
+        del obs
+        shm.close()
+        remote.close()
+
+
+class SubprocVecOvercookedEnvironment:
+    """num_envs OvercookedEnvironments of one level, in num_workers processes.
+
+    Args:
+        arglist: Arguments for every environment. Workers always run with
+            --no-display.
+        num_envs: Number of environments.
+        num_workers: Number of worker processes (default: one per CPU, at
+            most num_envs). Environments are split evenly between them.
+        observation_fn: Function from an environment to the array observation
+            to return (default: its image observation, see
+            OvercookedEnvironment.get_image_obs). It must return the same
+            shape and dtype every time.
+
+    The observation array returned by `reset` and `step` is backed by shared
+    memory and overwritten by the next call; copy it to keep it.
+    """
+
+    def __init__(self, arglist, num_envs, num_workers=None, observation_fn=None):
+        arglist = copy.copy(arglist)
+        arglist.no_display = True
+        self.num_envs = num_envs
+        num_workers = min(num_workers or mp.cpu_count(), num_envs)
+
+        # One environment in this process fixes the observation's shape.
+        probe = _make_env(arglist)
+        self.agent_names = probe.get_agent_names()
+        first = _observe(probe, observation_fn)
+        shape = (num_envs,) + first.shape
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape))*first.dtype.itemsize))
+        self.obs = np.ndarray(shape, dtype=first.dtype, buffer=self.shm.buf)
+
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        self.slices = list(zip(bounds[:-1], bounds[1:]))
+        self.remotes, self.processes = [], []
+        for start, stop in self.slices:
+            remote, worker_remote = mp.Pipe()
+            process = mp.Process(
+                    target=_worker,
+                    args=(worker_remote, remote, arglist, self.shm, shape, first.dtype,
+                          start, stop, observation_fn),
+                    daemon=True)
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self.closed = False
+
+    def reset(self):
+        """Reset every environment and return the observations."""
+        for remote in self.remotes:
+            remote.send(('reset', None))
+        for remote in self.remotes:
+            remote.recv()
+        return self.obs
+
+    def step_async(self, action_dicts):
+        """Send one {agent name: action} dict per environment to the workers."""
+        for remote, (start, stop) in zip(self.remotes, self.slices):
+            remote.send(('step', action_dicts[start:stop]))
+
+    def step_wait(self):
+        """Wait for step_async's results: (obs, reward, done, info), where
+        reward and done are (num_envs,) arrays and info a list of dicts.
+        Environments that are done have been reset, so their observation is
+        the next episode's first."""
+        results = [result for remote in self.remotes for result in remote.recv()]
+        rewards, dones, infos = zip(*results)
+        return self.obs, np.array(rewards), np.array(dones), list(infos)
+
+    def step(self, action_dicts):
+        self.step_async(action_dicts)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join()
+        del self.obs
+        self.shm.close()
+        self.shm.unlink()
+        self.closed = True
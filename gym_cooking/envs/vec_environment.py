@@ -0,0 +1,266 @@
+"""Batched Overcooked environment for high-throughput rollouts.
+
+`VecOvercookedEnvironment` steps N copies of one level in lockstep. Each
+kitchen's state is held in stacked NumPy arrays using the object codes of
+`utils.encoding`, and `step` applies collision resolution, interactions,
+deliveries, `done` and `reward` to all N kitchens at once, following
+`OvercookedEnvironment.step`. Finished kitchens are reset automatically.
+"""
+import numpy as np
+
+from envs.overcooked_environment import OvercookedEnvironment
+import utils.encoding as encoding
+from utils.core import Object
+from utils.utils import is_collidable
+from utils.encoding import (FLOOR, CUTBOARD, DELIVERY, TRASH, SPAWNER,
+        CONTENT_KINDS, BITS_PER_KIND, KIND_MASK, FRESH_MASK, PLATE_CODE)
+
+
+def _num_contents(codes):
+    return sum(encoding.kind_count(codes, k) for k in range(len(CONTENT_KINDS)))
+
+def _needs_chopped(codes):
+    return (_num_contents(codes) == 1) & ((codes & FRESH_MASK) != 0)
+
+def _is_deliverable(codes):
+    return (_num_contents(codes) > 1) & ((codes & FRESH_MASK) == 0)
+
+def _mergeable(codes1, codes2):
+    return ((encoding.kind_count(codes1, 0) + encoding.kind_count(codes2, 0) <= 1) &
+            (((codes1 | codes2) & FRESH_MASK) == 0))
+
+def _add_codes(codes1, codes2):
+    merged = np.zeros_like(codes1)
+    for k in range(len(CONTENT_KINDS)):
+        count = encoding.kind_count(codes1, k) + encoding.kind_count(codes2, k)
+        if np.any(count > KIND_MASK):
+            raise ValueError("Object has more than {} of {}".format(KIND_MASK, CONTENT_KINDS[k]))
+        merged |= (count << (BITS_PER_KIND*k)).astype(merged.dtype)
+    return merged
+
+def recipe_code(recipe):
+    """Return the object code of recipe's finished dish."""
+    contents = [type(c)() if c.name == 'Plate' else type(c)(state_index=c.state_index % len(c.state_seq))
+                for c in recipe.contents]
+    return encoding.object_code(Object(location=None, contents=contents))
+
+
+class VecOvercookedEnvironment:
+    """N kitchens of the same level, stepped together.
+
+    State (index 0 of every array is the kitchen):
+        agent_locations: (N, num_agents, 2) agent (x, y), in
+            `layout.agent_names` order.
+        agent_holding: (N, num_agents) object code each agent holds (0: none).
+        objects: (N, width, height) object code on each counter, cutboard and
+            food spawner (0: empty).
+        orders: (N, num_recipes) whether each recipe is still to be delivered.
+        t, score: (N,) timestep and number of deliveries this episode.
+
+    Objects dropped on a delivery square never affect later transitions, so
+    they are kept as a per-kitchen log (`dropped`, `dropped_cells`,
+    `num_dropped`) rather than in `objects`.
+    """
+
+    def __init__(self, arglist, num_envs):
+        env = OvercookedEnvironment(arglist)
+        env.reset()
+        self.arglist = arglist
+        self.num_envs = num_envs
+        self.layout = encoding.Layout(env)
+        self.num_agents = len(self.layout.agent_names)
+        self.recipe_codes = np.array([recipe_code(r) for r in env.recipes], dtype=encoding.ENCODING_DTYPE)
+        self.delivery_cells = [loc for loc, kind in np.ndenumerate(self.layout.kinds) if kind == DELIVERY]
+
+        # Initial state of one kitchen, which every kitchen resets to.
+        start = encoding.encode(env)
+        num_agents = self.num_agents
+        self._start_agents = start[:3*num_agents].reshape(-1, 3).astype(np.int64)
+        self._start_objects = np.zeros((self.layout.width, self.layout.height), dtype=encoding.ENCODING_DTYPE)
+        self._start_dropped = []
+        for code, x, y in start[3*num_agents:].reshape(-1, 3).tolist():
+            if self.layout.kinds[x, y] == DELIVERY:
+                self._start_dropped.append((code, self.delivery_cells.index((x, y))))
+            else:
+                self._start_objects[x, y] = code
+
+        max_t = arglist.max_num_timesteps or 100
+        self.agent_locations = np.zeros((num_envs, num_agents, 2), dtype=np.int64)
+        self.agent_holding = np.zeros((num_envs, num_agents), dtype=encoding.ENCODING_DTYPE)
+        self.objects = np.zeros((num_envs,) + self._start_objects.shape, dtype=encoding.ENCODING_DTYPE)
+        self.orders = np.zeros((num_envs, len(self.recipe_codes)), dtype=bool)
+        self.t = np.zeros(num_envs, dtype=np.int64)
+        self.score = np.zeros(num_envs, dtype=np.int64)
+        self.dropped = np.zeros((num_envs, len(self._start_dropped) + max_t*num_agents), dtype=encoding.ENCODING_DTYPE)
+        self.dropped_cells = np.zeros(self.dropped.shape, dtype=np.int64)
+        self.num_dropped = np.zeros(num_envs, dtype=np.int64)
+        self.reset()
+
+    def reset(self, mask=None):
+        """Reset the kitchens selected by the boolean array mask (all by
+        default) and return the observation."""
+        if mask is None:
+            mask = np.ones(self.num_envs, dtype=bool)
+        self.agent_locations[mask] = self._start_agents[:, :2]
+        self.agent_holding[mask] = self._start_agents[:, 2]
+        self.objects[mask] = self._start_objects
+        self.orders[mask] = True
+        self.t[mask] = 0
+        self.score[mask] = 0
+        self.num_dropped[mask] = len(self._start_dropped)
+        for i, (code, cell) in enumerate(self._start_dropped):
+            self.dropped[mask, i] = code
+            self.dropped_cells[mask, i] = cell
+        return self.observe()
+
+    def observe(self):
+        """Return a copy of the per-kitchen state arrays."""
+        return {"agent_locations": self.agent_locations.copy(),
+                "agent_holding": self.agent_holding.copy(),
+                "objects": self.objects.copy(),
+                "orders": self.orders.copy(),
+                "t": self.t.copy()}
+
+    def step(self, actions):
+        """Step every kitchen.
+
+        Args:
+            actions: (N, num_agents, 2) array of (dx, dy) actions, in
+                `layout.agent_names` order.
+
+        Returns:
+            (obs, reward, done, info) with one row per kitchen. Kitchens that
+            are done have already been reset, so their obs is the next
+            episode's first; info["terminal_obs"] holds the final states.
+        """
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs, self.num_agents, 2)
+        self.t += 1
+        actions = self.check_collisions(actions)
+        for i in range(self.num_agents):
+            self._interact(i, actions[:, i])
+
+        reward = self.score.copy()
+        successful = ~self.orders.any(axis=1)
+        done = successful.copy()
+        if self.arglist.max_num_timesteps:
+            timed_out = self.t >= self.arglist.max_num_timesteps
+            successful &= ~timed_out
+            done |= timed_out
+
+        info = {"t": self.t.copy(), "successful": successful, "actions": actions}
+        if done.any():
+            info["terminal_obs"] = self.observe()
+            obs = self.reset(done)
+        else:
+            obs = self.observe()
+        return obs, reward, done, info
+
+    def check_collisions(self, actions):
+        """Return actions with the moves OvercookedEnvironment.check_collisions
+        would cancel set to (0, 0)."""
+        locations = self.agent_locations
+        targets = locations + actions
+        blocked = is_collidable(self.layout.collidable, targets[..., 0], targets[..., 1])
+        next_locations = np.where(blocked[..., None], locations, targets)
+        moving = (actions != 0).any(axis=2)
+        stays = (next_locations == locations).all(axis=2)
+
+        execute = np.ones(actions.shape[:2], dtype=bool)
+        for i in range(self.num_agents):
+            for j in range(i + 1, self.num_agents):
+                same = (next_locations[:, i] == next_locations[:, j]).all(axis=1)
+                swap = ((locations[:, i] == next_locations[:, j]).all(axis=1) &
+                        (locations[:, j] == next_locations[:, i]).all(axis=1))
+                i_blocked = same & stays[:, i] & moving[:, i]
+                j_blocked = same & ~i_blocked & stays[:, j] & moving[:, j]
+                both = (same & ~i_blocked & ~j_blocked) | (~same & swap)
+                execute[:, i] &= ~(j_blocked | both)
+                execute[:, j] &= ~(i_blocked | both)
+        return np.where(execute[..., None], actions, 0)
+
+    def _interact(self, i, action):
+        """Mirrors utils.interact.interact for agent i in every kitchen."""
+        n = np.arange(self.num_envs)
+        location = self.agent_locations[:, i]
+        x = np.clip(location[:, 0] + action[:, 0], 0, self.layout.width - 1)
+        y = np.clip(location[:, 1] + action[:, 1], 0, self.layout.height - 1)
+        kind = self.layout.kinds[x, y]
+        holding = self.agent_holding[:, i]
+        cell = self.objects[n, x, y]
+        acting = (action != 0).any(axis=1)
+
+        moves = acting & (kind == FLOOR)
+        location[moves, 0] = x[moves]
+        location[moves, 1] = y[moves]
+
+        # Agent is holding something.
+        held = acting & ~moves & (holding != 0)
+        delivers = held & (kind == DELIVERY)
+        counter = held & (kind != DELIVERY) & (kind != SPAWNER)
+        merges = counter & (cell != 0) & _mergeable(holding, cell)
+        places = counter & (cell == 0)
+        chops = places & (kind == CUTBOARD) & _needs_chopped(holding) & (not self.layout.play)
+        trashes = places & ~chops & (kind == TRASH)
+        places &= ~chops & ~trashes
+
+        # Agent's hands are free.
+        picks = acting & ~moves & (holding == 0) & (cell != 0) & (kind != DELIVERY)
+        chops_in_place = picks & (kind == CUTBOARD) & _needs_chopped(cell) & self.layout.play
+        picks &= ~chops_in_place
+
+        if delivers.any():
+            self._deliver(delivers, holding[delivers], x, y)
+            holding[delivers] = 0
+        if merges.any():
+            merged = _add_codes(holding[merges], cell[merges])
+            if self.layout.play:
+                self.objects[n[merges], x[merges], y[merges]] = merged
+                holding[merges] = 0
+            else:
+                self.objects[n[merges], x[merges], y[merges]] = 0
+                holding[merges] = merged
+        holding[chops] = encoding.chop(holding[chops])
+        holding[trashes] = np.where(encoding.kind_count(holding[trashes], 0) != 0, PLATE_CODE, 0)
+        self.objects[n[places], x[places], y[places]] = holding[places]
+        holding[places] = 0
+
+        self.objects[n[chops_in_place], x[chops_in_place], y[chops_in_place]] = encoding.chop(cell[chops_in_place])
+        holding[picks] = cell[picks]
+        clears = picks & (kind != SPAWNER)
+        self.objects[n[clears], x[clears], y[clears]] = 0
+
+    def _deliver(self, mask, codes, x, y):
+        """Drop codes on the delivery squares of the kitchens in mask and fill
+        the first matching order for each deliverable one."""
+        kitchens = np.flatnonzero(mask)
+        slots = self.num_dropped[kitchens]
+        if slots.max() >= self.dropped.shape[1]:
+            self.dropped = np.concatenate([self.dropped, np.zeros_like(self.dropped)], axis=1)
+            self.dropped_cells = np.concatenate([self.dropped_cells, np.zeros_like(self.dropped_cells)], axis=1)
+        self.dropped[kitchens, slots] = codes
+        self.dropped_cells[kitchens, slots] = [self.delivery_cells.index(loc)
+                                               for loc in zip(x[kitchens].tolist(), y[kitchens].tolist())]
+        self.num_dropped[kitchens] += 1
+
+        deliverable = _is_deliverable(codes)
+        matches = self.orders[kitchens] & (self.recipe_codes == codes[:, None]) & deliverable[:, None]
+        filled = matches.any(axis=1)
+        first = matches.argmax(axis=1)
+        self.orders[kitchens[filled], first[filled]] = False
+        self.score[kitchens[filled]] += 1
+
+    def encode(self, index):
+        """Return kitchen index's state as a `utils.encoding` encoding."""
+        agents = np.concatenate([self.agent_locations[index], self.agent_holding[index, :, None]], axis=1)
+        xs, ys = np.nonzero(self.objects[index])
+        objs = [(int(self.objects[index, x, y]), int(x), int(y)) for x, y in zip(xs, ys)]
+        for slot in range(self.num_dropped[index]):
+            x, y = self.delivery_cells[self.dropped_cells[index, slot]]
+            objs.append((int(self.dropped[index, slot]), int(x), int(y)))
+        objs.sort()
+        return np.concatenate([agents.ravel(), np.array(objs, dtype=np.int64).ravel()]).astype(encoding.ENCODING_DTYPE)
+
+    def get_env(self, index):
+        """Return kitchen index as an OvercookedEnvironment (e.g. to display
+        or plan from it); its time, score and orders are not restored."""
+        return encoding.decode(self.encode(index), self.layout)
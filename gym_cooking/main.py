@@ -2,10 +2,12 @@
 # from gym_cooking.envs import OvercookedEnvironment
 from recipe_planner.recipe import *
 from utils.world import World
-from utils.agent import YourAgent, COLORS
+from utils.agent import YourAgent
 from utils.core import *
+from utils.utils import get_model_types
 from misc.game.gameplay import GamePlay
 from misc.metrics.metrics_bag import Bag
+import utils.log as log
 
 import numpy as np
 import random
@@ -15,7 +17,7 @@ from collections import namedtuple
 import gym
 
 
-def parse_arguments():
+def parse_arguments(args=None):
     parser = argparse.ArgumentParser("Overcooked 2 argument parser")
 
     # Environment
@@ -25,6 +27,11 @@ def parse_arguments():
     parser.add_argument("--max-num-subtasks", type=int, default=14, help="Max number of subtasks for recipe")
     parser.add_argument("--seed", type=int, default=1, help="Fix pseudorandom seed")
     parser.add_argument("--with-image-obs", action="store_true", default=False, help="Return observations as images (instead of objects)")
+    parser.add_argument("--obs-mode", type=str, default="object", choices=["object", "tensor"], help="Observation returned by reset() and step(): the environment object, or a (channels, height, width) grid tensor")
+    parser.add_argument("--reuse-buffers", action="store_true", default=False, help="Have step() overwrite preallocated observation, action mask, reward and done arrays and one info dict, instead of allocating new ones")
+    parser.add_argument("--level-cache", type=str, default=None, help="Directory for compiled levels; reset() compiles the level there once and memory-maps it afterwards")
+    parser.add_argument("--no-display", action="store_true", default=False, help="Skip the text display (and agent status printout) at every step")
+    parser.add_argument("--snapshot-copies", action="store_true", default=False, help="Copy environments copy-on-write, sharing unchanged world objects between copies")
 
     # Delegation Planner
     parser.add_argument("--beta", type=float, default=1.3, help="Beta for softmax in Bayesian delegation updates")
@@ -34,11 +41,15 @@ def parse_arguments():
     parser.add_argument("--tau", type=int, default=2, help="Normalize v diff")
     parser.add_argument("--cap", type=int, default=75, help="Max number of steps in each main loop of BRTDP")
     parser.add_argument("--main-cap", type=int, default=100, help="Max number of main loops in each run of BRTDP")
+    parser.add_argument("--lower-bound-cache-size", type=int, default=40000, help="Max number of lower bounds cached per process, shared across worlds with the same layout")
 
     # Visualizations
     parser.add_argument("--play", action="store_true", default=False, help="Play interactive game with keys")
     parser.add_argument("--replay", type=str, default=None, help="Visualise a replay of a saved game. Example usage: python main.py --replay misc/metrics/pickles/partial-divider_salad_agents2_seed1_model1-random_model2-random.pkl")
+    parser.add_argument("--replay-keyframe-interval", type=int, default=16, help="With --replay, keep the state every this many timesteps, so seeking simulates at most this many steps")
     parser.add_argument("--record", action="store_true", default=False, help="Save observation at each time step as an image in misc/game/record")
+    parser.add_argument("--record-format", type=str, default="png", choices=["png", "zip", "gif"], help="With --record, write one PNG per time step, one episode.zip of them, or one animated episode.gif")
+    parser.add_argument("--log-level", type=str, default="WARNING", help="Log level for all subsystems (e.g. INFO), optionally followed by per-subsystem levels (e.g. INFO,planner=DEBUG); subsystems are env, planner and delegator")
 
     # Models
     # Valid options: `bd` = Bayes Delegation; `up` = Uniform Priors
@@ -47,8 +58,9 @@ def parse_arguments():
     parser.add_argument("--model2", type=str, default=None, help="Model type for agent 2 (random, user, advacned)")
     parser.add_argument("--model3", type=str, default=None, help="Model type for agent 3 (random, user, advacned)")
     parser.add_argument("--model4", type=str, default=None, help="Model type for agent 4 (random, user, advacned)")
+    parser.add_argument("--models", type=str, nargs="+", default=None, help="Model type of every agent in order, for any number of agents (e.g. --models bd bd bd bd bd bd); replaces --model1..4")
 
-    return parser.parse_args()
+    return parser.parse_args(args)
 
 
 def fix_seed(seed):
@@ -56,31 +68,18 @@ def fix_seed(seed):
     random.seed(seed)
 
 
-def initialize_agents(arglist):
+def initialize_agents(arglist, env):
     agents = []
 
-    with open('utils/levels/{}.txt'.format(arglist.level), 'r') as f:
-        phase = 1
-        recipes = []
-        for line in f:
-            line = line.strip('\n')
-            if line == '':
-                phase += 1
-
-            # phase 2: read in recipe list
-            elif phase == 2:
-                recipes.append(globals()[line]())
-
-            # phase 3: read in agent locations (up to num_agents)
-            elif phase == 3:
-                if len(agents) < arglist.num_agents:
-                    loc = line.split(' ')
-                    agent = YourAgent(
-                            arglist=arglist,
-                            name='agent-'+str(len(agents)+1),
-                            id_color=COLORS[len(agents)],
-                            recipes=recipes)
-                    agents.append(agent)
+    # Recipes and agent spawns come from the env's (possibly compiled) level.
+    recipes = [type(recipe)() for recipe in env.recipes]
+    for sim_agent in env.sim_agents:
+        agent = YourAgent(
+                arglist=arglist,
+                name=sim_agent.name,
+                id_color=sim_agent.color,
+                recipes=recipes)
+        agents.append(agent)
 
     return agents
 
@@ -90,7 +89,7 @@ def main_loop(arglist):
     print("Initializing environment and agents.")
     env = gym.envs.make("gym_cooking:overcookedEnv-v0", arglist=arglist)
     obs = env.reset()
-    agents = initialize_agents(arglist=arglist)    
+    agents = initialize_agents(arglist=arglist, env=env)    
 
     # Info bag for saving pkl files
     bag = Bag(arglist=arglist, filename=env.filename)
@@ -116,12 +115,15 @@ def main_loop(arglist):
 
     # Saving final information before saving pkl file
     bag.set_collisions(collisions=env.collisions)
+    bag.set_cache_stats(cache_stats=World.lower_bound_cache.stats())
     bag.set_termination(termination_info=env.termination_info,
             successful=env.successful)
+    env.close()  # finish writing any --record frames
 
 
 if __name__ == '__main__':
     arglist = parse_arguments()
+    log.configure(arglist.log_level)
     # test environment for manually playing the game
     if arglist.play:
         env = gym.envs.make("gym_cooking:overcookedEnv-v0", arglist=arglist)
@@ -133,11 +135,11 @@ if __name__ == '__main__':
     elif arglist.replay is not None:
         env = gym.envs.make("gym_cooking:overcookedEnv-v0", arglist=arglist)
         env.reset()
-        game = GamePlay(env.filename, env.world, env.sim_agents)
-        game.on_replay(arglist.replay)
+        game = GamePlay(env)
+        game.on_replay(arglist.replay, keyframe_interval=arglist.replay_keyframe_interval)
     # test environment for running experiments
     else:
-        model_types = [arglist.model1, arglist.model2, arglist.model3, arglist.model4]
+        model_types = get_model_types(arglist)
         assert len(list(filter(lambda x: x is not None,
             model_types))) == arglist.num_agents, "num_agents should match the number of models specified"
         fix_seed(seed=arglist.seed)
@@ -0,0 +1,75 @@
+"""Compare deep environment copies against copy-on-write snapshots.
+
+Reports the time per `copy.copy(env)` and the time and memory per planner
+state when BRTDP plans a subtask, for both copy modes. Usage, e.g.:
+
+    python misc/benchmarks/copy_benchmark.py --level open-divider_tl --num-agents 2
+"""
+import argparse
+import contextlib
+import copy
+import os
+import sys
+import time
+import tracemalloc
+
+# Imports and level files are resolved relative to gym_cooking/.
+GYM_COOKING_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(GYM_COOKING_DIR)
+os.chdir(GYM_COOKING_DIR)
+
+from envs.overcooked_environment import OvercookedEnvironment
+from navigation_planner.planners.e2e_brtdp import E2E_BRTDP
+from main import parse_arguments, fix_seed
+
+
+def parse_benchmark_arguments():
+    parser = argparse.ArgumentParser("Environment copy benchmark")
+    parser.add_argument("--num-copies", type=int, default=2000, help="Number of env copies to time")
+    parser.add_argument("--subtask-index", type=int, default=0, help="Index into env.all_subtasks to plan for")
+    return parser.parse_known_args()
+
+
+def time_copies(env, num_copies):
+    """Return seconds per copy.copy(env)."""
+    start = time.perf_counter()
+    for _ in range(num_copies):
+        copy.copy(env)
+    return (time.perf_counter() - start) / num_copies
+
+
+def plan_subtask(env, subtask, arglist):
+    """Run BRTDP once for agent-1 on subtask and return (num states, seconds, bytes)."""
+    planner = E2E_BRTDP(alpha=arglist.alpha, tau=arglist.tau,
+            cap=arglist.cap, main_cap=arglist.main_cap)
+    tracemalloc.start()
+    start = time.perf_counter()
+    planner.get_next_action(env=copy.copy(env), subtask=subtask,
+            subtask_agent_names=(env.sim_agents[0].name,), other_agent_planners={})
+    seconds = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(planner.repr_to_env_dict), seconds, memory
+
+
+def main():
+    bench_args, env_args = parse_benchmark_arguments()
+    print("{:>10} | {:>12} | {:>8} | {:>12} | {:>12}".format(
+        "mode", "us / copy", "states", "ms / state", "KB / state"))
+    for snapshot_copies in [False, True]:
+        arglist = parse_arguments(env_args)
+        arglist.snapshot_copies = snapshot_copies
+        fix_seed(seed=arglist.seed)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            env = OvercookedEnvironment(arglist)
+            env.reset()
+            per_copy = time_copies(env, bench_args.num_copies)
+            subtask = env.all_subtasks[bench_args.subtask_index]
+            num_states, seconds, memory = plan_subtask(env, subtask, arglist)
+        print("{:>10} | {:>12.1f} | {:>8} | {:>12.3f} | {:>12.2f}".format(
+            "snapshot" if snapshot_copies else "deep", 1e6 * per_copy, num_states,
+            1e3 * seconds / num_states, memory / 1024. / num_states))
+
+
+if __name__ == '__main__':
+    main()
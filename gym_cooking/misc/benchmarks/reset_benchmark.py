@@ -0,0 +1,53 @@
+"""Measure `env.reset()` latency.
+
+Reports the time of the first reset of a level in this process (which parses
+the level, or loads it from --level-cache, and saves the level's prototype)
+and the mean time of later resets, which clone the prototype. Usage, e.g.:
+
+    python misc/benchmarks/reset_benchmark.py --level open-divider_tl --num-agents 2
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+# Imports and level files are resolved relative to gym_cooking/.
+GYM_COOKING_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(GYM_COOKING_DIR)
+os.chdir(GYM_COOKING_DIR)
+
+from envs.overcooked_environment import OvercookedEnvironment
+from main import parse_arguments
+
+
+def parse_benchmark_arguments():
+    parser = argparse.ArgumentParser("Environment reset benchmark")
+    parser.add_argument("--num-resets", type=int, default=1000, help="Number of resets to time after the first")
+    return parser.parse_known_args()
+
+
+def time_reset(env):
+    """Return seconds for one env.reset()."""
+    start = time.perf_counter()
+    env.reset()
+    return time.perf_counter() - start
+
+
+def main():
+    bench_args, env_args = parse_benchmark_arguments()
+    arglist = parse_arguments(env_args)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        env = OvercookedEnvironment(arglist)
+        first = time_reset(env)
+        later = sum(time_reset(env) for _ in range(bench_args.num_resets)) / bench_args.num_resets
+        # A new env of the same level starts from the prototype too.
+        new_env = time_reset(OvercookedEnvironment(arglist))
+    print("{:>24} | {:>12}".format("reset", "ms"))
+    print("{:>24} | {:>12.3f}".format("first (builds level)", 1e3 * first))
+    print("{:>24} | {:>12.3f}".format("later (from prototype)", 1e3 * later))
+    print("{:>24} | {:>12.3f}".format("new env (from prototype)", 1e3 * new_env))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Image observations composited with NumPy, without pygame.
+
+`TileCompositor` draws the same pixels as `GameImage.get_image_obs` using
+only NumPy and Pillow (to decode the sprites), so headless environments and
+vectorized workers never import or initialize pygame:
+
+    the static layout (floor, counters, cutboards, ...) is drawn once per
+    level into a background image;
+    every tile that has objects or agents on it is composited once per
+    distinct content (e.g. "agent-blue holding a plated tomato on a
+    counter") and cached;
+    a frame is the background with the cached tiles pasted in.
+
+Sprites are scaled with the same nearest-neighbour sampling as
+pygame.transform.scale and alpha-blended with the same integer arithmetic as
+pygame's blit, so the result matches the pygame renderer pixel for pixel.
+`render_batch` renders many environments of one level into one preallocated
+(N, height, width, 3) array.
+"""
+import numpy as np
+from PIL import Image
+
+from utils.core import Counter, Cutboard, Delivery, Trash, FoodSpawner
+from misc.game.sprites import Color, SpriteGeometry, get_sprite_path, TILE_SCALE
+
+
+_images = {}  # {sprite path: (height, width, 4) uint8 RGBA}
+
+
+def get_image(path):
+    """Return the decoded RGBA pixels of the sprite at path, decoded once per
+    process."""
+    image = _images.get(path)
+    if image is None:
+        with Image.open(path) as f:
+            image = _images[path] = np.asarray(f.convert("RGBA"))
+    return image
+
+
+def scale_image(image, size):
+    """Scale an (h, w, c) image to size (width, height), sampling pixels as
+    pygame.transform.scale does."""
+    height, width = image.shape[:2]
+    xs = np.arange(size[0]) * width // size[0]
+    ys = np.arange(size[1]) * height // size[1]
+    return image[ys[:, None], xs]
+
+
+def blend(dst, src):
+    """Alpha-blend the RGBA image src over the RGB image dst in place, with
+    pygame's blit arithmetic."""
+    s = src[..., :3].astype(np.int32)
+    a = src[..., 3:].astype(np.int32)
+    d = dst.astype(np.int32)
+    dst[...] = ((((s - d) * a + s) >> 8) + d)
+
+
+class TileCompositor:
+    """Renders image observations of one level's environments.
+
+    Tied to the level's layout, which every env passed to `render` must
+    share (any copy or reset of the same level does); the caches grow with
+    the distinct tile contents seen, which are few.
+    """
+
+    def __init__(self, env, scale=TILE_SCALE, holding_scale=0.5, container_scale=0.7):
+        self.geometry = SpriteGeometry(scale, holding_scale, container_scale)
+        self.scale = scale
+        self.width = scale * env.world.width
+        self.height = scale * env.world.height
+        self._sprites = {}  # {(name, size): (h, w, 4) uint8}
+        self._tiles = {}  # {(gridsquare location, sprite draws): (scale, scale, 3) uint8}
+        self.background = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.background[...] = Color.FLOOR
+        for gs in env.world.loc_to_gridsquare.values():
+            if isinstance(gs, (Counter, Cutboard, Trash, Delivery, FoodSpawner)):
+                self._draw_gridsquare(gs)
+
+    @property
+    def shape(self):
+        return (self.height, self.width, 3)
+
+    def sprite(self, name, size):
+        key = (name, size)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = self._sprites[key] = scale_image(get_image(get_sprite_path(name)), size)
+        return sprite
+
+    def _tile(self, location):
+        """Return the index of the tile at location in an image."""
+        x, y = self.scale * location[0], self.scale * location[1]
+        return slice(y, y + self.scale), slice(x, x + self.scale)
+
+    def _draw_gridsquare(self, gs):
+        tile = self._tile(gs.location)
+        pixels = self.background[tile]
+        if isinstance(gs, Delivery):
+            pixels[...] = Color.DELIVERY
+        else:
+            pixels[...] = Color.SPAWNER if isinstance(gs, FoodSpawner) else Color.COUNTER
+            # 1px outline, as pygame.draw.rect(..., width=1).
+            pixels[[0, -1], :] = Color.COUNTER_BORDER
+            pixels[:, [0, -1]] = Color.COUNTER_BORDER
+        if isinstance(gs, (Delivery, Cutboard, Trash)):
+            name = type(gs).__name__.lower()
+            blend(pixels, self.sprite(name, self.geometry.tile_size))
+
+    def _draw_tile(self, location, draws):
+        """Return the tile at location with the sprite draws composited over
+        the background, from the cache if possible."""
+        key = (location, draws)
+        pixels = self._tiles.get(key)
+        if pixels is None:
+            tile = self._tile(location)
+            pixels = self.background[tile].copy()
+            for name, size, (dx, dy) in draws:
+                sprite = self.sprite(name, size)
+                # Clip sprites that overhang the tile (not the case for the
+                # default scales).
+                h, w = min(size[1], self.scale - dy), min(size[0], self.scale - dx)
+                blend(pixels[dy:dy + h, dx:dx + w], sprite[:h, :w])
+            self._tiles[key] = pixels
+        return pixels
+
+    def render(self, env, out=None):
+        """Return env's image observation as a (height, width, 3) uint8 RGB
+        array, written into out if given."""
+        if out is None:
+            out = np.empty(self.shape, dtype=np.uint8)
+        np.copyto(out, self.background)
+
+        world = env.world
+        draws = {}  # {location: [sprite draws]}, in drawing order
+        for location, objs in world.loc_to_objects.items():
+            objs = [o for o in objs if not o.is_held]
+            if len(objs) > 1:
+                # Same order as the pygame renderer: world.objects order.
+                order = {id(o): i for i, o in enumerate(
+                        o for o_list in world.objects.values() for o in o_list)}
+                objs.sort(key=lambda o: order[id(o)])
+            for o in objs:
+                draws.setdefault(location, []).extend(
+                        self.geometry.object_sprites(o.full_name, held=False))
+        for agent in env.sim_agents:
+            draws.setdefault(agent.location, []).extend(self.geometry.agent_sprites(agent))
+
+        for location, sprites in draws.items():
+            if sprites:
+                tile = self._tile(location)
+                out[tile] = self._draw_tile(location, tuple(sprites))
+        return out
+
+    def render_batch(self, envs, out=None):
+        """Return the image observations of envs as one (len(envs), height,
+        width, 3) uint8 array, written into out if given."""
+        if out is None:
+            out = np.empty((len(envs),) + self.shape, dtype=np.uint8)
+        for env, image in zip(envs, out):
+            self.render(env, out=image)
+        return out
@@ -3,9 +3,10 @@ import pygame
 import numpy as np
 from utils.core import *
 from misc.game.utils import *
+from misc.game.sprites import graphics_dir, get_sprite_path, SpriteGeometry, TILE_SCALE
 
-graphics_dir = 'misc/game/graphics'
 _image_library = {}
+_atlases = {}
 
 def get_image(path):
     global _image_library
@@ -16,6 +17,54 @@ def get_image(path):
         _image_library[path] = image
     return image
 
+def get_atlas(scale, holding_scale, container_scale):
+    """Return the SpriteAtlas for these visual parameters, shared by every
+    Game drawn with them."""
+    key = (scale, holding_scale, container_scale)
+    atlas = _atlases.get(key)
+    if atlas is None:
+        atlas = _atlases[key] = SpriteAtlas(scale, holding_scale, container_scale)
+    return atlas
+
+
+class SpriteAtlas(SpriteGeometry):
+    """Sprites scaled once to the sizes a Game draws them at.
+
+    `sprite(name, size)` scales each image once. `object_sprites(full_name,
+    held)` turns an object's full_name into the (sprite, offset within the
+    tile) pairs to blit (see SpriteGeometry.object_sprites), so drawing
+    never rescales an image or touches the object."""
+
+    def __init__(self, scale, holding_scale, container_scale):
+        SpriteGeometry.__init__(self, scale, holding_scale, container_scale)
+        self._sprites = {}  # {(name, size): scaled surface}
+        self._objects = {}  # {(full_name, held): [(surface, offset), ...]}
+        self._format = None
+
+    def sprite(self, name, size):
+        key = (name, size)
+        image = self._sprites.get(key)
+        if image is None:
+            # Per-pixel alpha in the screen's channel order (ARGB), which
+            # blits several times faster than the PNG's RGBA, with the
+            # same pixels.
+            if self._format is None:
+                self._format = pygame.Surface((1, 1), pygame.SRCALPHA, 32)
+            image = pygame.transform.scale(get_image(get_sprite_path(name)), size)
+            image = self._sprites[key] = image.convert(self._format)
+        return image
+
+    def object_sprites(self, full_name, held):
+        """Return the (surface, offset) pairs that draw an object, held by an
+        agent or not."""
+        key = (full_name, held)
+        sprites = self._objects.get(key)
+        if sprites is None:
+            sprites = self._objects[key] = [
+                    (self.sprite(name, size), offset)
+                    for name, size, offset in SpriteGeometry.object_sprites(self, full_name, held)]
+        return sprites
+
 
 class Game:
     def __init__(self, world, sim_agents, play=False):
@@ -26,15 +75,25 @@ class Game:
         self.play = play
         
         # Visual parameters
-        self.scale = 80   # num pixels per tile
+        self.scale = TILE_SCALE   # num pixels per tile
         self.holding_scale = 0.5
         self.container_scale = 0.7
         self.width = self.scale * self.world.width
         self.height = self.scale * self.world.height
-        self.tile_size = (self.scale, self.scale)
-        self.holding_size = tuple((self.holding_scale * np.asarray(self.tile_size)).astype(int))
-        self.container_size = tuple((self.container_scale * np.asarray(self.tile_size)).astype(int))
-        self.holding_container_size = tuple((self.container_scale * np.asarray(self.holding_size)).astype(int))
+        self.atlas = get_atlas(self.scale, self.holding_scale, self.container_scale)
+        self.tile_size = self.atlas.tile_size
+        self.holding_size = self.atlas.holding_size
+        self.container_size = self.atlas.container_size
+        self.holding_container_size = self.atlas.holding_container_size
+
+        # Incremental rendering: the layout drawn once, the world whose
+        # changes (see World.track_changes) are pending redraw, and the
+        # agents' tiles in the last frame.
+        self.background = None
+        self.changes = None
+        self.changes_world = None
+        self.agent_cells = []
+        self.changed_rects = []  # screen areas the last on_render redrew
         #self.font = pygame.font.SysFont('arialttf', 10)
 
 
@@ -54,9 +113,28 @@ class Game:
 
 
     def on_render(self):
+        """Draw the current state. After the first frame only the tiles
+        whose objects or agents changed are redrawn, over a background of
+        the static layout; self.changed_rects lists what was redrawn."""
+        if self.background is None or self.changes_world is not self.world:
+            self.render_all()
+            if self.play:
+                pygame.display.flip()
+                pygame.display.update()
+        else:
+            cells = set(self.changes)
+            self.changes.clear()
+            cells.update(self.agent_cells)
+            cells.update(agent.location for agent in self.sim_agents)
+            self.changed_rects = [self.draw_tile(cell) for cell in cells]
+            if self.play:
+                pygame.display.update(self.changed_rects)
+        self.agent_cells = [agent.location for agent in self.sim_agents]
+
+    def render_all(self):
         self.screen.fill(Color.FLOOR)
         objs = []
-        
+
         # Draw gridsquares
         for o_list in self.world.objects.values():
             for o in o_list:
@@ -64,7 +142,10 @@ class Game:
                     self.draw_gridsquare(o)
                 elif o.is_held == False:
                     objs.append(o)
-        
+        self.background = self.screen.copy()
+        self.changes = self.world.track_changes()
+        self.changes_world = self.world
+
         # Draw objects not held by agents
         for o in objs:
             self.draw_object(o)
@@ -72,10 +153,26 @@ class Game:
         # Draw agents and their holdings
         for agent in self.sim_agents:
             self.draw_agent(agent)
-
-        if self.play:
-            pygame.display.flip()
-            pygame.display.update()
+        self.changed_rects = [self.screen.get_rect()]
+
+    def draw_tile(self, loc):
+        """Redraw the tile at loc from the background up; returns its rect."""
+        sl = self.scaled_location(loc)
+        rect = pygame.Rect(sl[0], sl[1], self.scale, self.scale)
+        self.screen.blit(self.background, rect, rect)
+
+        # Same order as a full render: objects in world.objects order, then agents.
+        objs = [o for o in self.world.loc_to_objects.get(loc, ()) if not o.is_held]
+        if len(objs) > 1:
+            order = {id(o): i for i, o in enumerate(
+                    o for o_list in self.world.objects.values() for o in o_list)}
+            objs.sort(key=lambda o: order[id(o)])
+        for o in objs:
+            self.draw_object(o)
+        for agent in self.sim_agents:
+            if agent.location == loc:
+                self.draw_agent(agent)
+        return rect
 
 
     def draw_gridsquare(self, gs):
@@ -107,9 +204,7 @@ class Game:
         return
 
     def draw(self, path, size, location):
-        image_path = '{}/{}.png'.format(graphics_dir, path)
-        image = pygame.transform.scale(get_image(image_path), size)
-        self.screen.blit(image, location)
+        self.screen.blit(self.atlas.sprite(path, size), location)
 
 
     def draw_agent(self, agent):
@@ -120,25 +215,16 @@ class Game:
     def draw_agent_object(self, obj):
         # Holding shows up in bottom right corner.
         if obj is None: return
-        if any([isinstance(c, Plate) for c in obj.contents]): 
-            self.draw('Plate', self.holding_size, self.holding_location(obj.location))
-            if len(obj.contents) > 1:
-                plate = obj.unmerge('Plate')
-                self.draw(obj.full_name, self.holding_container_size, self.holding_container_location(obj.location))
-                obj.merge(plate)
-        else:
-            self.draw(obj.full_name, self.holding_size, self.holding_location(obj.location))
+        self.blit_sprites(self.atlas.object_sprites(obj.full_name, held=True), obj.location)
 
     def draw_object(self, obj):
         if obj is None: return
-        if any([isinstance(c, Plate) for c in obj.contents]): 
-            self.draw('Plate', self.tile_size, self.scaled_location(obj.location))
-            if len(obj.contents) > 1:
-                plate = obj.unmerge('Plate')
-                self.draw(obj.full_name, self.container_size, self.container_location(obj.location))
-                obj.merge(plate)
-        else:
-            self.draw(obj.full_name, self.tile_size, self.scaled_location(obj.location))
+        self.blit_sprites(self.atlas.object_sprites(obj.full_name, held=False), obj.location)
+
+    def blit_sprites(self, sprites, loc):
+        x, y = self.scale * loc[0], self.scale * loc[1]
+        for image, (dx, dy) in sprites:
+            self.screen.blit(image, (x + dx, y + dy))
 
     def scaled_location(self, loc):
         """Return top-left corner of scaled location given coordinates loc, e.g. (3, 4)"""
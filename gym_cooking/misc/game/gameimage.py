@@ -3,14 +3,17 @@ import os
 import numpy as np
 from PIL import Image
 from misc.game.game import Game
+from misc.game.recorder import FrameRecorder
 # from misc.game.utils import *
 
 
 class GameImage(Game):
-    def __init__(self, filename, world, sim_agents, record=False):
+    def __init__(self, filename, world, sim_agents, record=False, record_format="png"):
         Game.__init__(self, world, sim_agents)
         self.game_record_dir = 'misc/game/record/{}/'.format(filename)
         self.record = record
+        self.record_format = record_format
+        self.recorder = None
 
 
     def on_init(self):
@@ -24,19 +27,35 @@ class GameImage(Game):
             # Clear game_record folder
             for f in os.listdir(self.game_record_dir):
                 os.remove(os.path.join(self.game_record_dir, f))
+            self.recorder = FrameRecorder(self.game_record_dir, self.record_format)
 
-    def get_image_obs(self):
+    def get_image_obs(self, out=None):
+        """Render the screen and return it as a (height, width, 3) uint8 RGB
+        array, read straight from the surface's pixel buffer.
+
+        Args:
+            out: Optional (height, width, 3) uint8 array to write the image
+                into and return, e.g. a buffer reused across steps. By
+                default a new array is returned.
+        """
         self.on_render()
-        img_int = pygame.PixelArray(self.screen)
-        img_rgb = np.zeros([img_int.shape[1], img_int.shape[0], 3], dtype=np.uint8)
-        for i in range(img_int.shape[0]):
-            for j in range(img_int.shape[1]):
-                color = pygame.Color(img_int[i][j])
-                img_rgb[j, i, 0] = color.g
-                img_rgb[j, i, 1] = color.b
-                img_rgb[j, i, 2] = color.r
-        return img_rgb
+        # (width, height, 3) view of the screen; locks it until deleted.
+        pixels = pygame.surfarray.pixels3d(self.screen)
+        try:
+            if out is None:
+                return pixels.transpose(1, 0, 2).copy()
+            np.copyto(out, pixels.transpose(1, 0, 2))
+            return out
+        finally:
+            del pixels
 
     def save_image_obs(self, t):
+        """Record the frame of timestep t; the recorder writes it in the
+        background."""
         self.on_render()
-        pygame.image.save(self.screen, '{}/t={:03d}.png'.format(self.game_record_dir, t))
+        self.recorder.add(t, self.screen.copy())
+
+    def close_recording(self):
+        """Wait for the recorded frames to be written and finish the file."""
+        if self.recorder is not None:
+            self.recorder.close()
@@ -1,8 +1,8 @@
 # modules for game
 from misc.game.game import Game
+from misc.game.replay import Replay, KEYFRAME_INTERVAL
 from misc.game.utils import *
 from utils.core import *
-from utils.interact import interact
 
 # helpers
 import pygame
@@ -92,66 +92,45 @@ class GamePlay(Game):
             return (0, 0)
 
 
-    def on_replay_event(self, event, solution, current_timestep):
+    def on_replay_event(self, event, replay):
         if event.type == pygame.QUIT:
             self._running = False
-        elif event.type == pygame.KEYDOWN:            
+        elif event.type == pygame.KEYDOWN:
             # Switch current agent
             if pygame.key.name(event.key) in "1234":
                 try:
                     self.current_agent = self.sim_agents[int(pygame.key.name(event.key))-1]
                 except:
                     pass
-                return current_timestep
-            
-            # do nothing if we have not pressed a valid key
-            if event.key not in KeyToTuple.keys():
-                return current_timestep
-        
-            action = KeyToTuple[event.key]
-            if action == (0, 1) or action == (1, 0):
-                time_dir = 1
-            elif action == (0, -1) or action == (-1, 0):
-                time_dir = -1
-            max_time = max([len(agent_solution) for agent_solution in solution])
-            new_timestep = max(0, min(max_time-1, current_timestep + time_dir))
-            if new_timestep == current_timestep:
-                return current_timestep
-            print("timestep:", current_timestep, new_timestep, time_dir)
-            current_timestep = new_timestep
-            
-            # move each agent according to the solution
-            for agent_id in range(len(self.sim_agents)):
-                
-                # ensures that we cannot go beyond available timesteps in the solution
-                if current_timestep < 0:
-                    print(f"Cannot move backwards in time: simulation starts at timestep 0")
-                    continue
-                elif current_timestep >= len(solution[agent_id]):
-                    print(f"Cannot move forwards in time: simulation ends at timestep {len(solution[agent_id]) - 1}")
-                    continue
-                
-                # grabs the next action for the agent at the current timestep
-                current_location = self.sim_agents[agent_id].location
-                next_action = solution[agent_id][current_timestep]
-                new_location = tuple(np.asarray(current_location) + np.asarray(next_action))
-                if time_dir > 0:
-                    print(f"agent {agent_id} step FORWARD: moves {ActionToString[next_action]} from {current_location} to {new_location} at timestep {current_timestep}")
-                elif time_dir < 0:
-                    print(f"agent {agent_id} step BACKWARD: moves {ActionToString[next_action]} from {new_location} to {solution[agent_id][current_timestep]} at timestep {current_timestep-time_dir}")
-                
-                # # sanity checking valid moves
-                # valid_moves = get_single_actions(self.world, self.sim_agents[agent_id]) # TODO: figure out how to access world observations
-                # assert next_action not in valid_moves, f"Invalid move: {next_action} from {current_location} to {new_location}"
-                
-                # perform next action in simulator
-                self.sim_agents[agent_id].action = next_action
-                interact(self.sim_agents[agent_id], self.world)
-                print("new_location:", self.sim_agents[agent_id].location)
-        return current_timestep
-
-
-    def on_replay(self, replay_fname):
+                return
+
+            # Seek: arrows step one timestep, page up/down one keyframe
+            # interval, home/end to the start/end of the episode.
+            if event.key in KeyToTuple.keys():
+                action = KeyToTuple[event.key]
+                time_dir = 1 if action in [(0, 1), (1, 0)] else -1
+                t = replay.t + time_dir
+            elif event.key in ReplayKeyToStep.keys():
+                t = replay.t + ReplayKeyToStep[event.key] * replay.interval
+            elif event.key == pygame.K_HOME:
+                t = 0
+            elif event.key == pygame.K_END:
+                t = replay.num_timesteps
+            else:
+                return
+            self.seek(replay, t)
+
+    def seek(self, replay, t):
+        """Show timestep t of replay."""
+        if replay.seek(t) != t:
+            print("Cannot seek to timestep {}: the episode has timesteps 0 to {}".format(
+                    t, replay.num_timesteps))
+        print("timestep: {}/{}".format(replay.t, replay.num_timesteps))
+        for agent in self.sim_agents:
+            print("{} at {} holding {}".format(agent.name, agent.location, agent.holding))
+
+
+    def on_replay(self, replay_fname, keyframe_interval=KEYFRAME_INTERVAL):
         """takes solution: table of actions for each agent at each timestep"""
         solution = self.read_solution(replay_fname)
         if self.on_init() == False:
@@ -161,10 +140,11 @@ class GamePlay(Game):
         assert len(solution) == len(self.sim_agents), "Number of agents in solution does not match number of agents in simulation"
         assert all([len(agent_solution) == len(solution[0]) for agent_solution in solution]), "All agents must have the same number of timesteps (include wait actions)"
 
-        current_timestep = 0
+        replay = Replay(self.env, solution, interval=keyframe_interval)
+        self.seek(replay, 0)
         while self._running:
             for event in pygame.event.get():
-                current_timestep = self.on_replay_event(event, solution, current_timestep)
+                self.on_replay_event(event, replay)
             self.on_render()
         self.on_cleanup()
 
@@ -0,0 +1,123 @@
+"""Background writer for recorded frames (--record).
+
+`FrameRecorder` takes frames from the simulation and encodes and writes them
+on background threads, so a step only pays for copying the screen. Pillow
+releases the GIL while it compresses, so encoding overlaps with the
+simulation and the threads encode frames in parallel. The queue in front of
+them is bounded: when encoding or the disk falls behind, `add` blocks
+instead of buffering frames without limit.
+
+Formats:
+
+    png     one t=<t>.png per frame, as --record has always written
+    zip     one episode.zip holding those PNGs, written as frames arrive
+    gif     one animated episode.gif, written on close
+"""
+import atexit
+import io
+import os
+import queue
+import threading
+import zipfile
+
+import pygame
+from PIL import Image
+
+
+FORMATS = ["png", "zip", "gif"]
+MAX_PENDING_FRAMES = 32
+NUM_THREADS = 2
+# Fastest zlib level; the frames are mostly flat colour, so files stay small.
+PNG_COMPRESS_LEVEL = 1
+GIF_FRAME_MS = 200
+
+
+class FrameRecorder:
+    """Writes frames to directory in format on background threads.
+
+    Call `close` to wait for the pending frames and finish the file (the
+    GIF is only written then); it is also called at interpreter exit.
+    """
+
+    def __init__(self, directory, format="png", max_pending=MAX_PENDING_FRAMES,
+                 num_threads=NUM_THREADS):
+        if format not in FORMATS:
+            raise ValueError("Unknown record format {} (expected one of {})".format(
+                format, ', '.join(FORMATS)))
+        self.directory = directory
+        self.format = format
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.closed = False
+        self.archive = None
+        if format == "zip":
+            self.archive = zipfile.ZipFile(os.path.join(directory, "episode.zip"), "w")
+        self.gif_frames = []  # [(t, paletted image)], sorted on close
+        self.lock = threading.Lock()  # guards archive and gif_frames
+        self.threads = [threading.Thread(target=self._run, daemon=True)
+                        for _ in range(num_threads)]
+        for thread in self.threads:
+            thread.start()
+        atexit.register(self.close)
+
+    def add(self, t, surface):
+        """Queue the frame of timestep t. surface must not change afterwards
+        (pass a copy of the screen); blocks while the queue is full."""
+        self._raise_error()
+        self.queue.put((t, surface))
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        try:
+            self._finish()
+        except Exception as e:
+            self.error = self.error or e
+        self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError("Recording to {} failed".format(self.directory)) from self.error
+
+    def _run(self):
+        # Keeps draining the queue after an error, so that add never blocks.
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is None:
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    self.error = e
+
+    def _write(self, t, surface):
+        image = Image.frombytes("RGB", surface.get_size(), pygame.image.tostring(surface, "RGB"))
+        name = "t={:03d}.png".format(t)
+        if self.format == "png":
+            image.save(os.path.join(self.directory, name), compress_level=PNG_COMPRESS_LEVEL)
+        elif self.format == "zip":
+            data = io.BytesIO()
+            image.save(data, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+            with self.lock:
+                # PNGs are already compressed.
+                self.archive.writestr(name, data.getvalue(), compress_type=zipfile.ZIP_STORED)
+        else:
+            frame = image.quantize(method=2)  # fast octree
+            with self.lock:
+                self.gif_frames.append((t, frame))
+
+    def _finish(self):
+        if self.archive is not None:
+            self.archive.close()
+        if self.gif_frames:
+            frames = [frame for t, frame in sorted(self.gif_frames, key=lambda f: f[0])]
+            frames[0].save(os.path.join(self.directory, "episode.gif"), save_all=True,
+                           append_images=frames[1:], duration=GIF_FRAME_MS, loop=0)
+            self.gif_frames = []
@@ -0,0 +1,67 @@
+"""Random access into a saved episode (--replay).
+
+`Replay` simulates an episode's action log once and keeps the environment's
+state every `interval` timesteps (see OvercookedEnvironment.get_state).
+`seek(t)` restores the nearest of these keyframes at or before t and
+simulates forward from it, unless stepping on from the current timestep is
+shorter. Stepping forward or backward and jumping to any timestep therefore
+each cost at most `interval` simulated steps, however long the episode.
+"""
+
+KEYFRAME_INTERVAL = 16
+
+
+class Replay:
+    """Seekable replay of actions in env, from env's current state.
+
+    Args:
+        env: OvercookedEnvironment of the episode's level and agents, freshly
+            reset. Replaying changes its state in place.
+        actions: One list of actions per agent, in env.sim_agents order, as
+            saved in a metrics pickle: actions[i][t] is agent i's action at
+            step t + 1.
+        interval: Timesteps between keyframes.
+    """
+
+    def __init__(self, env, actions, interval=KEYFRAME_INTERVAL):
+        if interval < 1:
+            raise ValueError("Keyframe interval must be positive, got {}".format(interval))
+        self.env = env
+        self.actions = list(zip(*actions))  # [joint action of step t + 1]
+        self.interval = interval
+        self.start = env.t
+        self.keyframes = [env.get_state()]  # keyframes[k]: state at timestep k*interval
+        while self.t < self.num_timesteps:
+            self._step()
+            if self.t % interval == 0:
+                self.keyframes.append(env.get_state())
+        self.seek(0)
+
+    @property
+    def t(self):
+        """Current timestep, from 0 (the initial state) to num_timesteps."""
+        return self.env.t - self.start
+
+    @property
+    def num_timesteps(self):
+        return len(self.actions)
+
+    def seek(self, t):
+        """Bring the environment to timestep t (clipped to the episode) and
+        return it."""
+        t = max(0, min(self.num_timesteps, t))
+        if not self.t <= t <= self.t + t % self.interval:
+            self.env.set_state(self.keyframes[t // self.interval])
+        while self.t < t:
+            self._step()
+        return t
+
+    def _step(self):
+        # The state transition of env.step, without its observations and
+        # display.
+        env = self.env
+        for agent, action in zip(env.sim_agents, self.actions[self.t]):
+            agent.action = action
+        env.t += 1
+        env.check_collisions()
+        env.execute_navigation()
@@ -0,0 +1,76 @@
+"""What the renderers draw where, independent of pygame.
+
+Shared by the pygame renderer (misc.game.game) and the NumPy compositor
+(misc.game.compositor), so both lay out tiles, sprites and colors the same
+way.
+"""
+import os
+import numpy as np
+
+
+graphics_dir = 'misc/game/graphics'
+TILE_SCALE = 80  # num pixels per tile
+_sprite_paths = None
+
+
+class Color:
+    BLACK = (0, 0, 0)
+    FLOOR = (245, 230, 210)  # light gray
+    COUNTER = (220, 170, 110)   # tan/gray
+    COUNTER_BORDER = (114, 93, 51)  # darker tan
+    SPAWNER = (255, 165, 0)  # orange
+    DELIVERY = (96, 96, 96)  # grey
+
+
+def get_sprite_path(name):
+    """Return the path of the sprite called name in graphics_dir, matching
+    file names case-insensitively (e.g. 'Plate' is plate.png)."""
+    global _sprite_paths
+    if _sprite_paths is None:
+        _sprite_paths = {os.path.splitext(f)[0].lower(): '{}/{}'.format(graphics_dir, f)
+                         for f in os.listdir(graphics_dir) if f.endswith('.png')}
+    return _sprite_paths.get(name.lower(), '{}/{}.png'.format(graphics_dir, name))
+
+
+class SpriteGeometry:
+    """Sprite sizes and offsets within a tile for one set of visual
+    parameters, and which sprites draw an object."""
+
+    def __init__(self, scale, holding_scale, container_scale):
+        self.scale = scale
+        self.tile_size = (scale, scale)
+        self.holding_size = tuple((holding_scale * np.asarray(self.tile_size)).astype(int))
+        self.container_size = tuple((container_scale * np.asarray(self.tile_size)).astype(int))
+        self.holding_container_size = tuple((container_scale * np.asarray(self.holding_size)).astype(int))
+
+        # Offsets from a tile's top-left corner; see Game.*_location.
+        self.holding_offset = (int(scale*(1-holding_scale)),) * 2
+        self.container_offset = (int(scale*(1-container_scale)/2),) * 2
+        factor = (1-holding_scale) + (1-container_scale)/2*holding_scale
+        self.holding_container_offset = (int(scale*factor),) * 2
+
+    def object_sprites(self, full_name, held):
+        """Return the (sprite name, size, offset) triples that draw an object
+        with this full_name, held by an agent (in the tile's bottom right
+        corner) or not: a plate with any food on it drawn smaller on top."""
+        if held:
+            size, offset = self.holding_size, self.holding_offset
+            contained_size, contained_offset = self.holding_container_size, self.holding_container_offset
+        else:
+            size, offset = self.tile_size, (0, 0)
+            contained_size, contained_offset = self.container_size, self.container_offset
+        names = full_name.split('-')
+        if 'Plate' not in names:
+            return [(full_name, size, offset)]
+        sprites = [('Plate', size, offset)]
+        food = '-'.join(name for name in names if name != 'Plate')
+        if food:
+            sprites.append((food, contained_size, contained_offset))
+        return sprites
+
+    def agent_sprites(self, agent):
+        """Return the sprites that draw agent and what it holds."""
+        sprites = [('agent-{}'.format(agent.color), self.tile_size, (0, 0))]
+        if agent.holding is not None:
+            sprites += self.object_sprites(agent.holding.full_name, held=True)
+        return sprites
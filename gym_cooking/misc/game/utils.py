@@ -1,14 +1,7 @@
 import pygame
+from misc.game.sprites import Color
 
 
-class Color:
-    BLACK = (0, 0, 0)
-    FLOOR = (245, 230, 210)  # light gray
-    COUNTER = (220, 170, 110)   # tan/gray
-    COUNTER_BORDER = (114, 93, 51)  # darker tan
-    SPAWNER = (255, 165, 0)  # orange
-    DELIVERY = (96, 96, 96)  # grey
-
 KeyToTuple = {
     pygame.K_UP    : ( 0, -1),  #273
     pygame.K_DOWN  : ( 0,  1),  #274
@@ -16,6 +9,12 @@ KeyToTuple = {
     pygame.K_LEFT  : (-1,  0),  #276
 }
 
+# Replay seeking, in keyframe intervals (see misc.game.replay).
+ReplayKeyToStep = {
+    pygame.K_PAGEUP   : -1,
+    pygame.K_PAGEDOWN :  1,
+}
+
 ActionToString = {
     (0, -1)  :   "UP",
     (0, 1)   :   "DOWN",
@@ -1,5 +1,6 @@
 import dill as pickle
 import copy
+from utils.utils import get_model_types
 
 class Bag:
     def __init__(self, arglist, filename):
@@ -16,14 +17,9 @@ class Bag:
         self.data["num_completed_subtasks"] = []
 
         # Checking whether ablation
-        if self.arglist.model1 is not None:
-            self.data['agent-1'] = self.arglist.model1
-        if self.arglist.model2 is not None:
-            self.data['agent-2'] = self.arglist.model2
-        if self.arglist.model3 is not None:
-            self.data['agent-3'] = self.arglist.model3
-        if self.arglist.model4 is not None:
-            self.data['agent-4'] = self.arglist.model4
+        for i, model_type in enumerate(get_model_types(self.arglist)):
+            if model_type is not None:
+                self.data['agent-{}'.format(i+1)] = model_type
 
         # Prepare for agent information
         for info in ["states","actions", "subtasks", "subtask_agents", "bayes", "holding", "incomplete_subtasks"]:
@@ -39,6 +35,9 @@ class Bag:
     def set_collisions(self, collisions):
         self.data["collisions"] = collisions
 
+    def set_cache_stats(self, cache_stats):
+        self.data["lower_bound_cache"] = cache_stats
+
 
     def add_status(self, cur_time, agents):
         for a in agents:
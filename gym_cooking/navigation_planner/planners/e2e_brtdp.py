@@ -9,6 +9,7 @@ from navigation_planner.utils import MinPriorityQueue as mpq
 from utils.world import World
 from utils.interact import interact
 from utils.core import *
+from utils.log import get_logger
 
 from collections import defaultdict
 import numpy as np
@@ -16,10 +17,13 @@ import scipy as sp
 import random
 from itertools import product
 import copy
+import logging
 import time
 from functools import lru_cache
 from enum import Enum
 
+log = get_logger('planner')
+
 class PlannerLevel(Enum):
     LEVEL1 = 1
     LEVEL0 = 0
@@ -156,9 +160,9 @@ class E2E_BRTDP:
 
         # Terminating if this takes too long e.g. path is infeasible.
         counter = 0
-        start_repr = self.start.get_repr()
+        start_repr = self.start.get_state_key()
         diff = self.v_u[(start_repr, self.subtask)] - self.v_l[(start_repr, self.subtask)]
-        print("DIFF AT START: {}".format(diff))
+        log.debug("DIFF AT START: %s", diff)
 
         while True:
             counter += 1
@@ -167,14 +171,14 @@ class E2E_BRTDP:
             traj.push(x)
 
             # Get repr of current environment state.
-            x_repr = x.get_repr()
+            x_repr = x.get_state_key()
 
             # Get the planner state. If Planner Level is 1, then
             # modified_state will include the most likely actions of the
             # other agents. Otherwise, the modified_state will be the same
             # as state `x`.
             modified_state, other_agent_actions = self._get_modified_state_with_other_agent_actions(x)
-            modified_state_repr = modified_state.get_repr()
+            modified_state_repr = modified_state.get_state_key()
 
             # Get available actions from this state.
             actions = self.get_actions(state_repr=modified_state_repr)
@@ -206,10 +210,10 @@ class E2E_BRTDP:
             self.repr_init(env_state=x)
             self.value_init(env_state=x)
 
-        print("RUN SAMPLE EXPLORED {} STATES, took {}".format(len(traj), time.time()-start_time))
+        log.debug("RUN SAMPLE EXPLORED %d STATES, took %s", len(traj), time.time()-start_time)
         while not(traj.empty()):
             x = traj.pop()
-            x_repr = x.get_repr()
+            x_repr = x.get_state_key()
             actions = self.get_actions(state_repr=x_repr)
             self.v_u[(x_repr, self.subtask)] = min([
                 self.Q(state=x, action=a, value_f=self.v_u) for a in actions])
@@ -219,7 +223,7 @@ class E2E_BRTDP:
     def main(self):
         """Main loop function for BRTDP."""
         main_counter = 0
-        start_repr = self.start.get_repr()
+        start_repr = self.start.get_state_key()
 
         upper = self.v_u[(start_repr, self.subtask)]
         lower = self.v_l[(start_repr, self.subtask)]
@@ -227,21 +231,20 @@ class E2E_BRTDP:
 
         # Run until convergence or until you max out on iteration
         while (diff > self.alpha) and (main_counter < self.main_cap):
-            print('\nstarting main loop #', main_counter)
+            log.debug("starting main loop #%d", main_counter)
             new_upper = self.v_u[(start_repr, self.subtask)]
             new_lower = self.v_l[(start_repr, self.subtask)]
             new_diff = new_upper - new_lower
-            if new_diff > diff + 0.01:
+            if new_diff > diff + 0.01 and log.isEnabledFor(logging.DEBUG):
                 self.start.update_display()
-                self.start.display()
-                self.start.print_agents()
-                print('old: upper {}, lower {}'.format(upper, lower))
-                print('new: upper {}, lower {}'.format(new_upper, new_lower))
+                log.debug("bound gap grew at start state:\n%s", self.start)
+                log.debug("old: upper %s, lower %s", upper, lower)
+                log.debug("new: upper %s, lower %s", new_upper, new_lower)
             diff = new_diff
             upper = new_upper
             lower = new_lower
             main_counter +=1
-            print('diff = {}, self.alpha = {}'.format(diff, self.alpha))
+            log.debug("diff = %s, self.alpha = %s", diff, self.alpha)
             self.runSampleTrial()
 
     def _configure_planner_level(self, env, subtask_agent_names, other_agent_planners):
@@ -374,7 +377,7 @@ class E2E_BRTDP:
 
     def repr_init(self, env_state):
         """Initialize repr for environment state."""
-        es_repr = env_state.get_repr()
+        es_repr = env_state.get_state_key()
         if es_repr not in self.repr_to_env_dict:
             self.repr_to_env_dict[es_repr] = copy.copy(env_state)
         return es_repr
@@ -382,7 +385,7 @@ class E2E_BRTDP:
     def value_init(self, env_state):
         """Initialize value for environment state."""
         # Skip if already initialized.
-        es_repr = env_state.get_repr()
+        es_repr = env_state.get_state_key()
         if ((es_repr, self.subtask) in self.v_l and
             (es_repr, self.subtask) in self.v_u):
             return
@@ -465,7 +468,7 @@ class E2E_BRTDP:
 
     def get_expected_diff(self, start_state, action):
         # Get next state.
-        s_ = self.T(state_repr=start_state.get_repr(), action=action)
+        s_ = self.T(state_repr=start_state.get_state_key(), action=action)
 
         # Initialize state if it's new.
         s_repr = self.repr_init(env_state=s_)
@@ -504,7 +507,7 @@ class E2E_BRTDP:
             assert other_planner.planner_level == PlannerLevel.LEVEL0
 
             # Figure out what their most likely action is.
-            possible_actions = other_planner.get_actions(state_repr=other_planner.start.get_repr())
+            possible_actions = other_planner.get_actions(state_repr=other_planner.start.get_state_key())
             greedy_action = possible_actions[
                     argmin([other_planner.Q(state=other_planner.start,
                                             action=action,
@@ -527,7 +530,7 @@ class E2E_BRTDP:
 
     def get_next_action(self, env, subtask, subtask_agent_names, other_agent_planners):
         """Return next action."""
-        print("-------------[e2e]-----------")
+        log.debug("-------------[e2e]-----------")
         self.removed_object = None
         start_time = time.time()
 
@@ -541,33 +544,35 @@ class E2E_BRTDP:
         cur_state, other_agent_actions = self._get_modified_state_with_other_agent_actions(state=self.start)
 
         # BRTDP main loop.
-        actions = self.get_actions(state_repr=cur_state.get_repr())
+        actions = self.get_actions(state_repr=cur_state.get_state_key())
         action_index = argmin([
             self.Q(state=cur_state, action=a, value_f=self.v_l)
             for a in actions])
         a = actions[action_index]
         B = sum(self.get_expected_diff(cur_state, a).values())
-        diff = (self.v_u[(cur_state.get_repr(), self.subtask)] - self.v_l[(cur_state.get_repr(), self.subtask)])/self.tau
+        diff = (self.v_u[(cur_state.get_state_key(), self.subtask)] - self.v_l[(cur_state.get_state_key(), self.subtask)])/self.tau
         self.cur_state = cur_state
         if (B > diff):
-            print('exploring, B: {}, diff: {}'.format(B, diff))
+            log.debug("exploring, B: %s, diff: %s", B, diff)
             self.main()
 
         # Determine best action after BRTDP.
-        if self.is_goal_state(cur_state.get_repr()):
-            print('already at goal state, self.cur_obj_count:', self.cur_obj_count)
+        if self.is_goal_state(cur_state.get_state_key()):
+            log.debug("already at goal state, self.cur_obj_count: %s", self.cur_obj_count)
             return None
         else:
-            actions = self.get_actions(state_repr=cur_state.get_repr())
+            actions = self.get_actions(state_repr=cur_state.get_state_key())
             qvals = [self.Q(state=cur_state, action=a, value_f=self.v_l)
                     for a in actions]
-            print([x for x in zip(actions, qvals)])
-            print('upper is', self.v_u[(cur_state.get_repr(), self.subtask)])
-            print('lower is', self.v_l[(cur_state.get_repr(), self.subtask)])
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("%s", list(zip(actions, qvals)))
+                log.debug("upper is %s", self.v_u[(cur_state.get_state_key(), self.subtask)])
+                log.debug("lower is %s", self.v_l[(cur_state.get_state_key(), self.subtask)])
 
             action_index = argmin(np.array(qvals))
             a = actions[action_index]
 
-            print('chose action:', a)
-            print('cost:', self.cost(cur_state, a))
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("chose action: %s", a)
+                log.debug("cost: %s", self.cost(cur_state, a))
             return a
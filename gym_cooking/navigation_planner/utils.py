@@ -3,6 +3,7 @@ import recipe_planner.utils as recipe
 import recipe_planner.recipe
 import numpy as np
 import random
+from scipy.sparse import csr_matrix, csgraph
 
 from queue import PriorityQueue
 
@@ -50,6 +51,208 @@ class Stack:
     def __len__(self):
         return len(self.items)
 
+class NodeDistances:
+    """Shortest path lengths between reachability graph nodes, computed one
+    source at a time as they are queried.
+
+    `dist[sources, targets]` takes node id arrays and broadcasts them like
+    indexing an (N, N) matrix would, with id -1 (a missing node) at np.inf.
+    Each distinct source costs one BFS the first time it is queried and its
+    row is cached, so memory grows with the sources used rather than with
+    the square of the level's size."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.rows = {}  # {source id: (N + 1,) hop counts, inf for -1 and unreachable}
+    def row(self, source):
+        row = self.rows.get(source)
+        if row is None:
+            row = np.full(len(self.graph) + 1, np.inf, dtype=np.float32)
+            if source >= 0:
+                row[:-1] = self.graph.bfs([source])
+            self.rows[source] = row
+        return row
+    def __getitem__(self, index):
+        sources, targets = np.broadcast_arrays(*index)
+        unique, inverse = np.unique(sources, return_inverse=True)
+        rows = np.stack([self.row(int(source)) for source in unique])
+        return rows[inverse.reshape(sources.shape), targets]
+
+class DistanceTable:
+    """Read-only `distances[source][destination]` view of the shortest path
+    lengths between locations, where each location takes the closest of its
+    reachability graph nodes.
+
+    A source's row is computed by one BFS from its nodes the first time it is
+    read. Unreachable pairs are reported as np.inf, matching the old
+    dict-of-dicts cache."""
+
+    def __init__(self, graph, locations):
+        self.graph = graph
+        self.locations = list(locations)
+        self.index = {loc: i for i, loc in enumerate(self.locations)}
+        approaches = graph.approaches
+        self.location_nodes = np.array(
+                [[graph.node_id(loc, na) for na in approaches] for loc in self.locations],
+                dtype=int).reshape(-1, len(approaches))
+        self.rows = {}  # {source index: (len(locations),) distances}
+    def row(self, i):
+        row = self.rows.get(i)
+        if row is None:
+            nodes = self.location_nodes[i][self.location_nodes[i] >= 0]
+            node_row = np.full(len(self.graph) + 1, np.inf)
+            if len(nodes):
+                node_row[:-1] = self.graph.bfs(nodes)
+            row = self.rows[i] = node_row[self.location_nodes].min(axis=1)
+        return row
+    def __getitem__(self, source):
+        return DistanceRow(self, self.index[source])
+    def __contains__(self, source):
+        return source in self.index
+    def __iter__(self):
+        return iter(self.locations)
+    def __len__(self):
+        return len(self.locations)
+    def keys(self):
+        return list(self.locations)
+    def get(self, source, destination):
+        d = self.row(self.index[source])[self.index[destination]]
+        return int(d) if np.isfinite(d) else np.inf
+
+class DistanceRow:
+    """Distances from one source location, as returned by DistanceTable[source]."""
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+    def __getitem__(self, destination):
+        d = self.table.row(self.row)[self.table.index[destination]]
+        return int(d) if np.isfinite(d) else np.inf
+    def __contains__(self, destination):
+        return destination in self.table.index
+    def __iter__(self):
+        return iter(self.table.locations)
+    def __len__(self):
+        return len(self.table.locations)
+    def keys(self):
+        return list(self.table.locations)
+    def items(self):
+        return [(loc, self[loc]) for loc in self.table.locations]
+
+class ReachabilityGraph:
+    """Reachability graph of a grid, stored as CSR adjacency arrays.
+
+    Nodes are (location, approach) pairs: every non-collidable cell has a
+    (location, (0, 0)) node, and every collidable cell has a (location, nav)
+    node for each nav action that leads to a non-collidable cell (the side
+    it can be approached from). Node ids follow the sorted order of these
+    pairs, and `slot_ids[x, y, k]` maps (location, APPROACHES[k]) to its id,
+    or -1 if there is no such node.
+
+    Args:
+        collidable: (width, height) boolean NumPy array.
+        nav_actions: The four movement directions.
+    """
+
+    def __init__(self, collidable, nav_actions):
+        self.collidable = np.asarray(collidable, dtype=bool)
+        self.width, self.height = self.collidable.shape
+        self.approaches = sorted([(0, 0)] + list(nav_actions))
+        self.approach_index = {na: k for k, na in enumerate(self.approaches)}
+        stay = self.approach_index[(0, 0)]
+
+        # Neighbours of every cell in each direction, clamped to the grid.
+        xs, ys = np.meshgrid(np.arange(self.width), np.arange(self.height), indexing='ij')
+        exists = np.zeros((self.width, self.height, len(self.approaches)), dtype=bool)
+        exists[:, :, stay] = ~self.collidable
+        neighbours = {}
+        for na in nav_actions:
+            nx_ = np.clip(xs + na[0], 0, self.width - 1)
+            ny_ = np.clip(ys + na[1], 0, self.height - 1)
+            neighbours[na] = (nx_, ny_)
+            exists[:, :, self.approach_index[na]] = self.collidable & ~self.collidable[nx_, ny_]
+
+        self.slot_ids = np.full(exists.shape, -1)
+        self.slot_ids[exists] = np.arange(exists.sum())
+        self.node_slots = np.argwhere(exists)  # (N, 3) rows of (x, y, k)
+
+        # Edges floor <> floor and collidable approach node <> floor.
+        rows, cols = [], []
+        for na, (nx_, ny_) in neighbours.items():
+            moved = (nx_ != xs) | (ny_ != ys)
+            floor_floor = ~self.collidable & ~self.collidable[nx_, ny_] & moved
+            rows.append(self.slot_ids[:, :, stay][floor_floor])
+            cols.append(self.slot_ids[nx_, ny_, stay][floor_floor])
+            approach = exists[:, :, self.approach_index[na]]
+            a_ids = self.slot_ids[:, :, self.approach_index[na]][approach]
+            f_ids = self.slot_ids[nx_, ny_, stay][approach]
+            rows += [a_ids, f_ids]
+            cols += [f_ids, a_ids]
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        n = len(self.node_slots)
+        self.adjacency = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+        self.adjacency.sum_duplicates()
+        self.indptr, self.indices = self.adjacency.indptr, self.adjacency.indices
+
+    @classmethod
+    def from_arrays(cls, collidable, slot_ids, indptr, indices, nav_actions):
+        """Rebuild a graph from its collidable mask, slot ids and CSR arrays."""
+        graph = cls.__new__(cls)
+        graph.collidable = np.asarray(collidable, dtype=bool)
+        graph.width, graph.height = graph.collidable.shape
+        graph.approaches = sorted([(0, 0)] + list(nav_actions))
+        graph.approach_index = {na: k for k, na in enumerate(graph.approaches)}
+        graph.slot_ids = slot_ids
+        graph.node_slots = np.argwhere(np.asarray(slot_ids) >= 0)
+        n = len(graph.node_slots)
+        graph.adjacency = csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(n, n))
+        graph.indptr, graph.indices = graph.adjacency.indptr, graph.adjacency.indices
+        return graph
+
+    def __len__(self):
+        return len(self.node_slots)
+
+    def __contains__(self, node):
+        return self.node_id(*node) >= 0
+
+    def node_id(self, location, approach):
+        """Return the id of node (location, approach), or -1 if it does not exist."""
+        x, y = location
+        if not (0 <= x < self.width and 0 <= y < self.height) or approach not in self.approach_index:
+            return -1
+        return int(self.slot_ids[x, y, self.approach_index[approach]])
+
+    def node(self, node_id):
+        x, y, k = self.node_slots[node_id]
+        return ((int(x), int(y)), self.approaches[k])
+
+    @property
+    def nodes(self):
+        return [self.node(i) for i in range(len(self))]
+
+    def neighbors(self, node):
+        i = self.node_id(*node)
+        return [self.node(j) for j in self.indices[self.indptr[i]:self.indptr[i+1]]]
+
+    def bfs(self, sources):
+        """Return hop counts from the nearest of node ids sources to every node
+        (np.inf where unreachable)."""
+        return csgraph.dijkstra(self.adjacency, directed=False, unweighted=True,
+                                indices=np.asarray(sources), min_only=True)
+
+    def connected_components(self):
+        """Return (number of components, component label of every node)."""
+        return csgraph.connected_components(self.adjacency, directed=False)
+
+    def to_networkx(self):
+        """Return the graph as an nx.Graph over (location, approach) nodes."""
+        import networkx as nx
+        graph = nx.Graph()
+        graph.add_nodes_from(self.nodes)
+        coo = self.adjacency.tocoo()
+        graph.add_edges_from((self.node(i), self.node(j)) for i, j in zip(coo.row, coo.col) if i < j)
+        return graph
+
 def is_smaller(p_, p):
     if type(p) is not tuple:
         return p_[0] < p
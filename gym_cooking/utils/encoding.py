@@ -0,0 +1,294 @@
+"""Compact integer encoding of environment states.
+
+An encoded state is a flat `ENCODING_DTYPE` NumPy array
+
+    [x_1, y_1, holding_1, ..., x_n, y_n, holding_n,
+     code_1, x_1, y_1, ..., code_m, x_m, y_m]
+
+with one (location, held object code) triple per agent, in `env.sim_agents`
+order, followed by one (object code, location) triple per object that is not
+held by an agent, sorted. It covers the same state as
+`OvercookedEnvironment.get_repr`/`get_state_key`, so two environments with
+equal keys have equal encodings. Everything static (gridsquares, agent names,
+recipes) lives in a `Layout` built once per level; `encoding.tobytes()` is a
+hashable key of a few dozen bytes.
+"""
+import copy
+import numpy as np
+from collections import defaultdict
+
+from utils.core import *
+from utils.agent import SimAgent
+from utils.utils import resolve_collisions, is_collidable
+from utils.world import World
+
+
+ENCODING_DTYPE = np.uint16
+
+# An object code counts each kind of content in BITS_PER_KIND bits. A merge
+# adds two codes; chopping moves a count from the Fresh to the Chopped field.
+CONTENT_KINDS = [(Plate, None),
+                 (Tomato, 0), (Tomato, 1),
+                 (Lettuce, 0), (Lettuce, 1),
+                 (Onion, 0), (Onion, 1)]
+BITS_PER_KIND = 2
+KIND_MASK = (1 << BITS_PER_KIND) - 1
+PLATE_CODE = 1
+FRESH_MASK = sum(KIND_MASK << (BITS_PER_KIND*k) for k, (c, state_index) in enumerate(CONTENT_KINDS)
+                 if state_index == 0)
+
+# Gridsquare kinds, as stored in `Layout.kinds`.
+FLOOR, COUNTER, CUTBOARD, DELIVERY, TRASH, SPAWNER = range(6)
+GRIDSQUARE_KINDS = [(Floor, FLOOR), (Cutboard, CUTBOARD), (Delivery, DELIVERY),
+                    (Trash, TRASH), (FoodSpawner, SPAWNER), (Counter, COUNTER)]
+
+
+def content_kind(content):
+    for k, (cls, state_index) in enumerate(CONTENT_KINDS):
+        if isinstance(content, cls) and (state_index is None or content.state_index == state_index):
+            return k
+    raise ValueError("Cannot encode object content {}".format(content.full_name))
+
+def object_code(obj):
+    """Return the integer code of an Object (0 for None)."""
+    if obj is None:
+        return 0
+    code = 0
+    for content in obj.contents:
+        code = add_codes(code, 1 << (BITS_PER_KIND*content_kind(content)))
+    return code
+
+def make_object(code, location):
+    """Return a new Object whose object_code is code."""
+    contents = []
+    for k, (cls, state_index) in enumerate(CONTENT_KINDS):
+        for _ in range(kind_count(code, k)):
+            contents.append(cls() if state_index is None else cls(state_index=state_index))
+    return Object(location=location, contents=contents)
+
+def kind_count(code, k):
+    return (code >> (BITS_PER_KIND*k)) & KIND_MASK
+
+def add_codes(code1, code2):
+    """Return the code of the object merging code1 and code2 would make."""
+    merged = 0
+    for k in range(len(CONTENT_KINDS)):
+        count = kind_count(code1, k) + kind_count(code2, k)
+        if count > KIND_MASK:
+            raise ValueError("Object has more than {} of {}".format(KIND_MASK, CONTENT_KINDS[k]))
+        merged |= count << (BITS_PER_KIND*k)
+    return merged
+
+def num_contents(code):
+    return sum(kind_count(code, k) for k in range(len(CONTENT_KINDS)))
+
+def needs_chopped(code):
+    return num_contents(code) == 1 and bool(code & FRESH_MASK)
+
+def chop(code):
+    """Chops the single Fresh food of code; Chopped is the next field up."""
+    fresh = code & FRESH_MASK
+    return code - fresh + (fresh << BITS_PER_KIND)
+
+def is_deliverable(code):
+    return num_contents(code) > 1 and not code & FRESH_MASK
+
+def mergeable(code1, code2):
+    """Same rule as utils.core.mergeable: at most one plate, all food done."""
+    return (kind_count(code1, 0) + kind_count(code2, 0) <= 1 and
+            not (code1 | code2) & FRESH_MASK)
+
+
+class Layout:
+    """Static part of an environment that encodings are relative to.
+
+    Holds a template of env without any objects, which `decode` fills in,
+    and per-cell gridsquare kinds and collidability, which `step` uses."""
+
+    def __init__(self, env):
+        self.agent_names = [agent.name for agent in env.sim_agents]
+        self.width = env.world.width
+        self.height = env.world.height
+        self.play = env.arglist.play
+
+        self.kinds = np.full((self.width, self.height), FLOOR, dtype=np.int8)
+        self.collidable = np.zeros((self.width, self.height), dtype=bool)
+        for (x, y), gs in env.world.loc_to_gridsquare.items():
+            kind = next((kind for cls, kind in GRIDSQUARE_KINDS if isinstance(gs, cls)), None)
+            if kind is None:
+                raise ValueError("Cannot encode gridsquare {}".format(gs.name))
+            self.kinds[x, y] = kind
+            self.collidable[x, y] = gs.collidable
+
+        # Same environment, minus every object and held object.
+        world = World(env.arglist)
+        world.__dict__ = env.world.__dict__.copy()
+        world.objects = defaultdict(lambda : [])
+        world.loc_to_gridsquare = {}
+        world.loc_to_objects = defaultdict(list)
+        world.state_hash = 0
+        world.layout_hash = 0
+        world._dynamic_objects = None
+        world._token = None
+        world._dirty = None
+        world._change_sets = []
+        for gs in env.world.loc_to_gridsquare.values():
+            gs = copy.copy(gs)
+            if isinstance(gs, Delivery):
+                gs.holding = []
+            elif not isinstance(gs, FoodSpawner):
+                gs.holding = None
+            world.insert(gs)
+
+        self.template = type(env)(env.arglist)
+        self.template.__dict__ = env.__dict__.copy()
+        self.template.world = world
+        self.template.sim_agents = [
+                SimAgent(name=agent.name, id_color=agent.color, location=agent.location)
+                for agent in env.sim_agents]
+        self.template.obs_tm1 = None
+
+
+def encode(env):
+    """Return the encoding of env's state (see module docstring)."""
+    rows = []
+    for agent in env.sim_agents:
+        rows.append((agent.location[0], agent.location[1], object_code(agent.holding)))
+    objs = []
+    for location, cell_objs in env.world.loc_to_objects.items():
+        for obj in cell_objs:
+            if not obj.is_held:
+                objs.append((object_code(obj), location[0], location[1]))
+    objs.sort()
+    return np.array(rows + objs, dtype=ENCODING_DTYPE).ravel()
+
+def decode(encoding, layout):
+    """Return a new environment in the state encoding describes.
+
+    Time, score and orders are the layout's; the new environment's world
+    shares the layout's gridsquares copy-on-write (see World.snapshot)."""
+    template = layout.template
+    env = type(template)(template.arglist)
+    env.__dict__ = template.__dict__.copy()
+    env.world = template.world.snapshot()
+    num_agents = len(layout.agent_names)
+
+    _place_objects(env.world, encoding[3*num_agents:])
+    env.sim_agents = [SimAgent(name=agent.name, id_color=agent.color, location=agent.location)
+                      for agent in template.sim_agents]
+    _place_agents(env.world, env.sim_agents, encoding[:3*num_agents])
+    return env
+
+def restore(env, encoding):
+    """Put env's world and agents in the state encoding describes, in place.
+
+    Every object is replaced by a new one made from its code; gridsquares
+    and agents are kept. Time, score and orders are left to the caller."""
+    world = env.world
+    num_agents = len(env.sim_agents)
+    world.clear_objects()
+    _place_objects(world, encoding[3*num_agents:])
+    for agent in env.sim_agents:
+        agent.holding = None
+    _place_agents(world, env.sim_agents, encoding[:3*num_agents])
+
+def _place_objects(world, rows):
+    """Insert the objects of (code, x, y) rows onto their gridsquares."""
+    for code, x, y in rows.reshape(-1, 3).tolist():
+        obj = make_object(code, (x, y))
+        gs = world.own(world.get_gridsquare_at((x, y)), (x, y))
+        if isinstance(gs, FoodSpawner):
+            gs.holding = obj
+        elif not (isinstance(gs, Delivery) and obj.is_deliverable()):
+            gs.acquire(obj)  # delivered dishes are popped off the Delivery
+        world.insert(obj)
+
+def _place_agents(world, sim_agents, rows):
+    """Move empty-handed sim_agents to their (x, y, holding code) rows."""
+    for agent, (x, y, code) in zip(sim_agents, rows.reshape(-1, 3).tolist()):
+        agent.location = (x, y)
+        if code:
+            agent.acquire(make_object(code, (x, y)))
+            world.insert(agent.holding)
+
+def step(encoding, layout, actions):
+    """Step an encoded state without building an environment.
+
+    Follows OvercookedEnvironment.step: collisions are resolved as in
+    `check_collisions`, then agents interact in order as in `interact`.
+
+    Args:
+        actions: One (dx, dy) action per agent, in `layout.agent_names` order.
+
+    Returns:
+        (encoding, delivered): the next state's encoding and the codes of
+        the deliverable objects delivered during the step.
+    """
+    num_agents = len(layout.agent_names)
+    agents = encoding[:3*num_agents].reshape(-1, 3).tolist()
+    cells = defaultdict(list)  # {location: [code, ...]} of objects not held
+    for code, x, y in encoding[3*num_agents:].reshape(-1, 3).tolist():
+        cells[(x, y)].append(code)
+
+    actions = [tuple(action) for action in actions]
+    execute, _ = resolve_collisions(
+            [tuple(agent[:2]) for agent in agents], actions,
+            lambda location: is_collidable(layout.collidable, *location))
+    actions = [action if execute[i] else (0, 0) for i, action in enumerate(actions)]
+
+    delivered = []
+    for agent, action in zip(agents, actions):
+        _interact(layout, agent, action, cells, delivered)
+
+    objs = sorted((code, x, y) for (x, y), codes in cells.items() for code in codes)
+    return np.array(agents + objs, dtype=ENCODING_DTYPE).ravel(), delivered
+
+def _interact(layout, agent, action, cells, delivered):
+    """Mirrors utils.interact.interact on an [x, y, holding] agent row."""
+    if action == (0, 0):
+        return
+
+    x = min(max(agent[0] + action[0], 0), layout.width-1)
+    y = min(max(agent[1] + action[1], 0), layout.height-1)
+    kind = layout.kinds[x, y]
+    holding = agent[2]
+    objs = cells.get((x, y))
+
+    if kind == FLOOR:
+        agent[0], agent[1] = x, y
+
+    elif holding:
+        if kind == DELIVERY:
+            cells[(x, y)].append(holding)
+            agent[2] = 0
+            if is_deliverable(holding):
+                delivered.append(holding)
+        elif kind == SPAWNER:
+            pass
+        elif objs:
+            assert len(objs) == 1, "found {} objects at {}".format(len(objs), (x, y))
+            if mergeable(holding, objs[0]):
+                merged = add_codes(holding, objs[0])
+                if layout.play:
+                    objs[0] = merged
+                    agent[2] = 0
+                else:
+                    del cells[(x, y)]
+                    agent[2] = merged
+        else:
+            if kind == CUTBOARD and needs_chopped(holding) and not layout.play:
+                agent[2] = chop(holding)
+            elif kind == TRASH:
+                agent[2] = PLATE_CODE if kind_count(holding, 0) else 0
+            else:
+                cells[(x, y)].append(holding)
+                agent[2] = 0
+
+    elif objs and kind != DELIVERY:
+        assert len(objs) == 1, "found {} objects at {}".format(len(objs), (x, y))
+        if kind == CUTBOARD and needs_chopped(objs[0]) and layout.play:
+            objs[0] = chop(objs[0])
+        else:
+            agent[2] = objs[0]
+            if kind != SPAWNER:
+                del cells[(x, y)]
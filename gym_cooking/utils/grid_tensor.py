@@ -0,0 +1,91 @@
+"""Multi-channel symbolic grid observations.
+
+A grid tensor is a (channels, height, width) uint8 array with, in order:
+
+    one plane per gridsquare kind (1 where the cell is of that kind),
+    one plane per content kind of the objects lying on the cell (counts),
+    one plane per agent, in `env.sim_agents` order (1 at its location),
+    one plane per content kind of the object each agent holds (counts, at
+    the agent's location).
+
+Content kinds are those of utils.encoding (plate, fresh/chopped tomato,
+lettuce, onion); `channel_names(num_agents)` names every plane.
+`GridTensor` keeps one up to date incrementally: the world reports the cells
+each interaction touched (see World.track_changes) and only those are
+recounted, along with the agents' cells.
+"""
+import numpy as np
+
+from utils.encoding import CONTENT_KINDS, GRIDSQUARE_KINDS, FLOOR, content_kind
+
+
+# Indexed by utils.encoding gridsquare kind.
+GRIDSQUARE_CHANNELS = ["Floor", "Counter", "Cutboard", "Delivery", "Trash", "FoodSpawner"]
+CONTENT_CHANNELS = [(cls() if state_index is None else cls(state_index=state_index)).full_name
+                    for cls, state_index in CONTENT_KINDS]
+
+
+def channel_names(num_agents):
+    return (GRIDSQUARE_CHANNELS + CONTENT_CHANNELS
+            + ["agent-{}".format(i+1) for i in range(num_agents)]
+            + ["held-{}".format(name) for name in CONTENT_CHANNELS])
+
+
+class GridTensor:
+    """Grid tensor of one environment's world and agents, updated in place.
+
+    Tied to the env's current world: build a new one after the world is
+    replaced (reset, copies)."""
+
+    def __init__(self, env):
+        self.world = env.world
+        self.sim_agents = env.sim_agents
+        self.content_offset = len(GRIDSQUARE_CHANNELS)
+        self.agent_offset = self.content_offset + len(CONTENT_CHANNELS)
+        self.held_offset = self.agent_offset + len(self.sim_agents)
+        num_channels = self.held_offset + len(CONTENT_CHANNELS)
+        self.array = np.zeros((num_channels, self.world.height, self.world.width), dtype=np.uint8)
+
+        # Gridsquares never change kind, so their planes are filled once.
+        self.array[FLOOR] = 1
+        for (x, y), gs in self.world.loc_to_gridsquare.items():
+            kind = next((kind for cls, kind in GRIDSQUARE_KINDS if isinstance(gs, cls)), None)
+            if kind is None:
+                raise ValueError("Cannot encode gridsquare {}".format(gs.name))
+            self.array[FLOOR, y, x] = 0
+            self.array[kind, y, x] = 1
+
+        self.changes = self.world.track_changes()
+        for location in list(self.world.loc_to_objects):
+            self._update_cell(location)
+        self.agent_cells = []
+        self._update_agents()
+
+    def update(self):
+        """Bring the array up to date and return it (not a copy)."""
+        for location in self.changes:
+            self._update_cell(location)
+        self.changes.clear()
+        self._update_agents()
+        return self.array
+
+    def _update_cell(self, location):
+        x, y = location
+        planes = self.array[self.content_offset:self.agent_offset, y, x]
+        planes[:] = 0
+        for obj in self.world.loc_to_objects.get(location, ()):
+            if not obj.is_held:
+                for content in obj.contents:
+                    planes[content_kind(content)] += 1
+
+    def _update_agents(self):
+        for x, y in self.agent_cells:
+            self.array[self.agent_offset:, y, x] = 0
+        self.agent_cells = []
+        for i, agent in enumerate(self.sim_agents):
+            x, y = agent.location
+            self.array[self.agent_offset + i, y, x] = 1
+            if agent.holding is not None:
+                for content in agent.holding.contents:
+                    self.array[self.held_offset + content_kind(content), y, x] += 1
+            self.agent_cells.append((x, y))
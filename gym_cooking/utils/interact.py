@@ -1,6 +1,9 @@
 from utils.core import *
+from utils.log import get_logger
 import numpy as np
 
+log = get_logger('env')
+
 def interact(agent, world):
     """Carries out interaction for this agent taking this action in this world.
 
@@ -13,25 +16,27 @@ def interact(agent, world):
 
     action_x, action_y = world.inbounds(tuple(np.asarray(agent.location) + np.asarray(agent.action)))
     gs = world.get_gridsquare_at((action_x, action_y))
+    # Copy-on-write worlds need private copies of whatever we may mutate.
+    gs = world.claim(agent, gs)
 
     # if floor in front --> move to that square
     if isinstance(gs, Floor): #and gs.holding is None:
-        agent.move_to(gs.location)
+        world.move_to(agent, gs.location)
 
     # if holding something
     elif agent.holding is not None:
         # if delivery in front --> deliver
         if isinstance(gs, Delivery):
             obj = agent.holding
-            gs.acquire(obj)
-            agent.release()
+            world.acquire(gs, obj)
+            world.release(agent)
             if obj.is_deliverable():
                 gs.release()  # remove delivery from kitchen
                 for recipe in world.active_orders:
                     if str(obj) == recipe.get_ingredients():
                         world.active_orders.remove(recipe)
                         break
-                print('\nDelivered {}!'.format(obj.full_name))
+                log.info("Delivered %s!", obj.full_name)
         
         # if food spawner in front --> do not interact
         elif isinstance(gs, FoodSpawner):
@@ -46,12 +51,12 @@ def interact(agent, world):
                 world.remove(obj)
                 o = gs.release() # agent is holding object
                 world.remove(agent.holding)
-                agent.acquire(obj)
+                world.acquire(agent, obj)
                 world.insert(agent.holding)
                 # if playable version, merge onto counter first
                 if world.arglist.play:
-                    gs.acquire(agent.holding)
-                    agent.release()
+                    world.acquire(gs, agent.holding)
+                    world.release(agent)
 
 
         # if holding something, empty gridsquare in front --> chop or drop
@@ -59,19 +64,19 @@ def interact(agent, world):
             obj = agent.holding
             if isinstance(gs, Cutboard) and obj.needs_chopped() and not world.arglist.play:
                 # normally chop, but if in playable game mode then put down first
-                obj.chop()
+                world.chop(obj)
             elif isinstance(gs, Trash):
-                agent.release()
+                world.release(agent)
                 world.remove(obj) # remove obj from world
                 if obj.contains('Plate'):
                     new_plate = Object(
                                 location=obj.location,
                                 contents=RepToClass['p']())
-                    agent.acquire(new_plate)
+                    world.acquire(agent, new_plate)
                     world.insert(new_plate)
             else:
-                gs.acquire(obj) # obj is put onto gridsquare
-                agent.release()
+                world.acquire(gs, obj) # obj is put onto gridsquare
+                world.release(agent)
                 assert world.get_object_at(gs.location, obj, find_held_objects =\
                     False).is_held == False, "Verifying put down works"
 
@@ -82,11 +87,11 @@ def interact(agent, world):
             obj = world.get_object_at(gs.location, None, find_held_objects = False)
             # if in playable game mode, then chop raw items on cutting board
             if isinstance(gs, Cutboard) and obj.needs_chopped() and world.arglist.play:
-                obj.chop()
+                world.chop(obj)
             else:
                 held_obj = gs.release()
                 assert held_obj == obj, "Verifying held object is the same as object on gridsquare"
-                agent.acquire(held_obj)
+                world.acquire(agent, held_obj)
                 if isinstance(gs, FoodSpawner): # add new food to world if spawner
                     world.insert(held_obj)
 
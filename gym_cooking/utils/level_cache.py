@@ -0,0 +1,65 @@
+"""Compiled level cache.
+
+Everything `OvercookedEnvironment.reset` derives from a level file alone
+(the parsed grid, recipes and agent spawns, the STRIPS subtasks and the
+reachability graph) is saved once as a directory of
+.npy files keyed by a hash of the level file's contents, and memory-mapped by
+later resets of the same level.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Bump whenever what is stored (or how it is computed) changes.
+CACHE_VERSION = 2
+
+_level_keys = {}  # {(level, max_num_subtasks): level_key}
+
+
+def level_path(level):
+    return 'utils/levels/{}.txt'.format(level)
+
+def level_key(level, max_num_subtasks):
+    """Return the hex digest identifying a level file's compiled artifact.
+
+    The file is read and hashed once per process; later calls return the
+    same key, so a level edited while a process runs is picked up by the
+    next process."""
+    key = _level_keys.get((level, max_num_subtasks))
+    if key is None:
+        digest = hashlib.sha1()
+        with open(level_path(level), 'rb') as file:
+            digest.update(file.read())
+        digest.update('|{}|{}'.format(max_num_subtasks, CACHE_VERSION).encode())
+        key = _level_keys[(level, max_num_subtasks)] = digest.hexdigest()
+    return key
+
+def compiled_dir(cache_dir, level, max_num_subtasks):
+    return os.path.join(cache_dir, '{}-{}'.format(level, level_key(level, max_num_subtasks)[:16]))
+
+def load(cache_dir, level, max_num_subtasks):
+    """Return {name: memory-mapped array} for a compiled level, or None if it
+    has not been compiled yet."""
+    path = compiled_dir(cache_dir, level, max_num_subtasks)
+    if not os.path.isdir(path):
+        return None
+    return {name[:-len('.npy')]: np.load(os.path.join(path, name), mmap_mode='r')
+            for name in os.listdir(path) if name.endswith('.npy')}
+
+def save(cache_dir, level, max_num_subtasks, arrays):
+    """Write {name: array} as the compiled level, unless another process
+    already has. Files are written to a temporary directory and moved into
+    place so readers never see a partial artifact."""
+    path = compiled_dir(cache_dir, level, max_num_subtasks)
+    if os.path.isdir(path):
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=cache_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, name + '.npy'), np.asarray(array))
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp)  # lost the race; the other artifact is identical
@@ -0,0 +1,53 @@
+"""Logging for the environment, planners and delegators.
+
+Each subsystem logs to its own `logging` logger under `gym_cooking`:
+
+    env         OvercookedEnvironment (steps, collisions, deliveries)
+    planner     navigation planners (E2E_BRTDP)
+    delegator   delegation planners (BayesianDelegator, SubtaskAllocDistribution)
+
+Messages use %-style arguments, so nothing is formatted unless the record is
+emitted, and call sites in hot loops check `isEnabledFor` before building
+their arguments. Nothing is configured by default: logging's own WARNING
+threshold applies, which keeps headless runs free of formatting work.
+"""
+import logging
+import sys
+
+ROOT = 'gym_cooking'
+SUBSYSTEMS = ['env', 'planner', 'delegator']
+FORMAT = '%(levelname)s %(name)s: %(message)s'
+
+
+def get_logger(subsystem):
+    return logging.getLogger('{}.{}'.format(ROOT, subsystem))
+
+def parse_levels(spec):
+    """Parse a spec such as "INFO" or "WARNING,planner=DEBUG" into
+    {logger name: level}. A bare level applies to every subsystem."""
+    levels = {}
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, level = part.rpartition('=')
+        level = level.upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError("Unknown log level {}".format(level))
+        if name and name not in SUBSYSTEMS:
+            raise ValueError("Unknown log subsystem {} (expected one of {})".format(
+                name, ', '.join(SUBSYSTEMS)))
+        levels['{}.{}'.format(ROOT, name) if name else ROOT] = level
+    return levels
+
+def configure(spec):
+    """Set logger levels from spec (see parse_levels) and print records to
+    stdout."""
+    root = logging.getLogger(ROOT)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(FORMAT))
+        root.addHandler(handler)
+        root.propagate = False
+    for name, level in parse_levels(spec).items():
+        logging.getLogger(name).setLevel(level)
@@ -1,8 +1,138 @@
+from collections import OrderedDict, defaultdict
+from itertools import combinations
+import numpy as np
+
+
+
+def get_model_types(arglist):
+    """Return the model type of agent-1, agent-2, ...: --models if given,
+    else --model1..4 (None for agents without a model)."""
+    if arglist.models:
+        return list(arglist.models)
+    return [arglist.model1, arglist.model2, arglist.model3, arglist.model4]
 
 def agent_settings(arglist, agent_name):
-    if agent_name[-1] == "1": return arglist.model1
-    elif agent_name[-1] == "2": return arglist.model2
-    elif agent_name[-1] == "3": return arglist.model3
-    elif agent_name[-1] == "4": return arglist.model4
-    else: raise ValueError("Agent name doesn't follow the right naming, `agent-<int>`")
+    prefix, _, index = agent_name.rpartition('-')
+    model_types = get_model_types(arglist)
+    if prefix != 'agent' or not index.isdigit() or not 1 <= int(index) <= len(model_types):
+        raise ValueError("Agent name doesn't follow the right naming, `agent-<int>`")
+    return model_types[int(index) - 1]
+
+def is_collidable(collidable, x, y):
+    """Return whether agents are blocked from entering cell (x, y).
+
+    The rule the layout-based steppers (utils.encoding.step and
+    VecOvercookedEnvironment) move agents by: cells marked in the level's
+    static (width, height) boolean collidable mask are blocked, and so is
+    every cell off the grid. World.is_collidable applies the same rule to
+    the live gridsquares. x and y are ints, or integer arrays of one shape
+    for a bool array of the same shape."""
+    width, height = collidable.shape
+    if np.ndim(x) == 0 and np.ndim(y) == 0:
+        return not (0 <= x < width and 0 <= y < height) or bool(collidable[x, y])
+    x, y = np.asarray(x), np.asarray(y)
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    return ~inside | collidable[np.clip(x, 0, width - 1), np.clip(y, 0, height - 1)]
+
+def resolve_collisions(locations, actions, is_collidable):
+    """Resolve every agent's move at once against occupancy grids.
+
+    Same outcome as checking each pair of agents with
+    `OvercookedEnvironment.is_collision`: agents that would end up in the
+    same cell are all stopped, except the lowest-numbered one that stays
+    put because it walked into something collidable; agents that would swap
+    cells are both stopped.
+
+    Args:
+        locations: List of the agents' (x, y) locations.
+        actions: List of the agents' (dx, dy) actions.
+        is_collidable: Function from a location to whether agents are
+            blocked from entering it.
+
+    Returns:
+        (execute, collisions): whether each agent can carry out its action,
+        and the sorted (i, j) index pairs of agents that collided.
+    """
+    next_locations = []
+    for (x, y), (dx, dy) in zip(locations, actions):
+        next_location = (x + dx, y + dy)
+        next_locations.append((x, y) if is_collidable(next_location) else next_location)
+
+    arriving = defaultdict(list)   # {cell: agents ending up there}
+    occupants = defaultdict(list)  # {cell: agents there now}
+    for i, (location, next_location) in enumerate(zip(locations, next_locations)):
+        arriving[next_location].append(i)
+        occupants[tuple(location)].append(i)
+
+    execute = [True for _ in locations]
+    collisions = []
+    for agents in arriving.values():
+        if len(agents) < 2:
+            continue
+        bumped = [i for i in agents
+                  if next_locations[i] == tuple(locations[i]) and tuple(actions[i]) != (0, 0)]
+        for i in agents:
+            if not bumped or i != bumped[0]:
+                execute[i] = False
+        collisions.extend(combinations(agents, 2))
+
+    for i, next_location in enumerate(next_locations):
+        for j in occupants.get(next_location, ()):
+            if (j > i and next_locations[j] == tuple(locations[i])
+                    and next_locations[j] != next_location):
+                execute[i] = execute[j] = False
+                collisions.append((i, j))
+    collisions.sort()
+    return execute, collisions
+
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Return the value cached for key (marking it recently used), else default."""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self._evict()
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        self._evict()
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize}
 
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
@@ -1,14 +1,43 @@
 import numpy as np
 from collections import defaultdict, OrderedDict
-from itertools import product, combinations
-import networkx as nx
+from itertools import combinations
 import copy
+import weakref
 import matplotlib.pyplot as plt
-from functools import lru_cache
+import random
 
 import recipe_planner.utils as recipe
-from navigation_planner.utils import manhattan_dist
-from utils.core import Object, GridSquare, Counter
+from navigation_planner.utils import DistanceTable, NodeDistances, ReachabilityGraph
+from utils.core import Object, GridSquare, Counter, Floor
+from utils.utils import LRUCache
+
+
+# Zobrist-style state hashing: every hashable repr (object, gridsquare or agent)
+# gets a fixed random 64-bit key, and a state's key is the sum of the keys of
+# its entities mod 2**64. Summing rather than XOR-ing keeps identical entities
+# (e.g. two delivered salads on one Delivery) from cancelling out.
+ZOBRIST_MASK = (1 << 64) - 1
+_zobrist_rng = random.Random(0)
+_zobrist_keys = {}
+
+def zobrist(entity_repr):
+    """Return the random 64-bit key of an entity repr."""
+    key = _zobrist_keys.get(entity_repr)
+    if key is None:
+        key = _zobrist_keys[entity_repr] = _zobrist_rng.getrandbits(64)
+    return key
+
+# Names of gridsquares that never change and so are left out of the state.
+STATIC_NAMES = ("Counter", "Floor", "Delivery", "Cutboard", "Trash", "FoodSpawner")
+
+def is_dynamic(name):
+    """Whether entities called name are part of the state (see get_dynamic_objects)."""
+    return name not in STATIC_NAMES and "Supply" not in name
+
+
+class ChangeSet(set):
+    """Locations changed since a consumer last cleared it (see
+    World.track_changes). A set subclass so that the world can hold it weakly."""
 
 
 ##################################################################################
@@ -23,12 +52,38 @@ class World:
                    (-1, 0), # move UP
                    (1, 0)]  # move DOWN
 
+    # Lower bounds shared by every world with the same layout (see
+    # get_lower_bound_between). Resized from --lower-bound-cache-size on reset.
+    lower_bound_cache = LRUCache(maxsize=40000)
+
     def __init__(self, arglist):
         self.rep = [] # [row0, row1, ..., rown]
+        # Cells to redraw on the next update_display; None forces a full
+        # redraw. self.rep may be shared with a copy until it is redrawn.
+        self._dirty = None
+        self._rep_shared = False
+        # Weak references to the ChangeSets handed out by track_changes.
+        # Copies of the world start without any.
+        self._change_sets = []
         self.arglist = arglist
         self.objects = defaultdict(lambda : [])
         self.active_orders = []  # List of active recipes in the world.
 
+        # Per-cell index, kept in sync by insert/remove/acquire/move_to.
+        self.loc_to_gridsquare = {}  # {location: gridsquare}
+        self.loc_to_objects = defaultdict(list)  # {location: [Object, ...]}
+
+        # State key of the dynamic objects, kept in sync with the index, and
+        # the repr it stands for, built lazily by get_dynamic_objects.
+        self.state_hash = 0
+        self._dynamic_objects = None
+        # Key of the gridsquares, likewise kept in sync with the index.
+        self.layout_hash = 0
+
+        # Copy-on-write ownership token. None means this world owns every
+        # entity it holds; otherwise only entities tagged with this token.
+        self._token = None
+
     def get_repr(self):
         return self.get_dynamic_objects()
 
@@ -37,177 +92,302 @@ class World:
         return '\n'.join(_display)
 
     def __copy__(self):
+        if self.arglist.snapshot_copies:
+            return self.snapshot()
         new = World(self.arglist)
         new.__dict__ = self.__dict__.copy()
         new.objects = copy.deepcopy(self.objects)
         new.reachability_graph = self.reachability_graph
         new.distances = self.distances
+        new.make_loc_to_gridsquare()
+        new.make_loc_to_objects()
+        new._token = None
+        new._dirty = None
+        new._change_sets = []
+        self._rep_shared = True
+        return new
+
+    def snapshot(self):
+        """Return a copy-on-write copy of this world.
+
+        Gridsquares and objects are shared with the copy; only the
+        containers that index them are copied. Both worlds take a fresh
+        ownership token, so each clones an entity (see `claim`) before the
+        first time it mutates it."""
+        new = World(self.arglist)
+        new.__dict__ = self.__dict__.copy()
+        new.objects = defaultdict(self.objects.default_factory,
+                                  {name: list(objs) for name, objs in self.objects.items()})
+        new.loc_to_gridsquare = dict(self.loc_to_gridsquare)
+        new.loc_to_objects = defaultdict(list,
+                                  {loc: list(objs) for loc, objs in self.loc_to_objects.items()})
+        new._token = object()
+        self._token = object()
+        new._dirty = None
+        new._change_sets = []
+        self._rep_shared = True
+        return new
+
+    def claim(self, agent, gs):
+        """Make everything agent's interaction with gs can mutate private to
+        this world: agent's held object and, unless gs is a floor, gs and the
+        objects lying on it. Returns this world's (possibly cloned) gs.
+
+        A no-op for worlds that do not share entities with a snapshot."""
+        if self._token is None:
+            return gs
+        if agent.holding is not None:
+            agent.holding = self.own(agent.holding, agent.location)
+        if isinstance(gs, Floor):
+            return gs
+        gs = self.own(gs, gs.location)
+        for obj in list(self.loc_to_objects.get(gs.location, ())):
+            if obj.is_held or self._owns(obj):
+                continue
+            new_obj = self._replace(obj, gs.location)
+            if gs.holding is obj:
+                gs.holding = new_obj
+            elif isinstance(gs.holding, list):
+                gs.holding = [new_obj if o is obj else o for o in gs.holding]
+        return gs
+
+    def own(self, entity, location):
+        """Return this world's private version of an entity at location,
+        cloning it first if it is shared with a snapshot."""
+        if self._token is None or self._owns(entity):
+            return entity
+        return self._replace(entity, location)
+
+    def _owns(self, entity):
+        return getattr(entity, '_owner', None) is self._token
+
+    def _replace(self, entity, location):
+        """Swap a shared entity for a private clone in objects and the index."""
+        new = object.__new__(type(entity))
+        new.__dict__ = entity.__dict__.copy()
+        new._owner = self._token
+        if isinstance(entity, Object):
+            new.contents = [copy.copy(c) for c in entity.contents]
+            cell = self.loc_to_objects[location]
+            cell[next(i for i, o in enumerate(cell) if o is entity)] = new
+        else:
+            if isinstance(entity.holding, list):
+                new.holding = list(entity.holding)
+            self.loc_to_gridsquare[location] = new
+        objs = self.objects[entity.name]
+        objs[next(i for i, o in enumerate(objs) if o is entity)] = new
         return new
 
     def update_display(self):
-        # Reset the current display (self.rep).
-        self.rep = [[' ' for i in range(self.width)] for j in range(self.height)]
-        objs = []
-        for o in self.objects.values():
-            objs += o
-        for obj in objs:
-            self.add_object(obj, obj.location)
-        for obj in self.objects["Tomato"]:
-            self.add_object(obj, obj.location)
+        """Bring self.rep up to date, redrawing only the cells that changed
+        since the last call (or everything, the first time)."""
+        if self._dirty is None or not self.rep:
+            # Reset the current display (self.rep).
+            self.rep = [[' ' for i in range(self.width)] for j in range(self.height)]
+            objs = []
+            for o in self.objects.values():
+                objs += o
+            for obj in objs:
+                self.add_object(obj, obj.location)
+            for obj in self.objects.get("Tomato", []):
+                self.add_object(obj, obj.location)
+            self._dirty = set()
+            self._rep_shared = False
+            return self.rep
+
+        if self._rep_shared:
+            self.rep = [row[:] for row in self.rep]
+            self._rep_shared = False
+        for location in self._dirty:
+            top = self.get_top_entity(location)
+            self.rep[location[1]][location[0]] = ' ' if top is None else str(top)
+        self._dirty.clear()
         return self.rep
 
+    def mark_dirty(self, location):
+        """Have the next update_display redraw location."""
+        if self._dirty is not None:
+            self._dirty.add(location)
+
+    def track_changes(self):
+        """Return a ChangeSet that collects the location of every later change
+        to this world's objects, for consumers that update incrementally (see
+        utils.grid_tensor). The consumer clears it after reading it; the
+        world stops filling it once the consumer drops it."""
+        self._change_sets = [ref for ref in self._change_sets if ref() is not None]
+        changes = ChangeSet()
+        self._change_sets.append(weakref.ref(changes))
+        return changes
+
+    def get_top_entity(self, location):
+        """Return the gridsquare or object a full redraw draws last at location:
+        the last one in self.objects order, except that tomatoes go on top."""
+        entities = self.loc_to_objects.get(location, [])[:]
+        if location in self.loc_to_gridsquare:
+            entities.append(self.loc_to_gridsquare[location])
+        tomatoes = [e for e in entities if e.name == "Tomato"]
+        if tomatoes:
+            entities = tomatoes
+        rank = {name: i for i, name in enumerate(self.objects)}
+        entities = [e for e in entities if e.name in rank]
+        if not entities:
+            return None
+        top_name = max(entities, key=lambda e: rank[e.name]).name
+        for obj in reversed(self.objects[top_name]):
+            if any(obj is e for e in entities):
+                return obj
+        return None
+
     def print_objects(self):
         for k, v in self.objects.items():
             print(k, list(map(lambda o: o.location, v)))
 
     def make_loc_to_gridsquare(self):
-        """Creates a mapping between object location and object."""
+        """Creates a mapping between gridsquare location and gridsquare."""
         self.loc_to_gridsquare = {}
         for obj in self.get_object_list():
             if isinstance(obj, GridSquare):
                 self.loc_to_gridsquare[obj.location] = obj
 
+    def make_loc_to_objects(self):
+        """Creates a mapping between location and the Objects at that location."""
+        self.loc_to_objects = defaultdict(list)
+        for obj in self.get_object_list():
+            if isinstance(obj, Object):
+                self.loc_to_objects[obj.location].append(obj)
+
     def make_reachability_graph(self):
         """Create a reachability graph between world objects."""
-        self.reachability_graph = nx.Graph()
-        for x in range(self.width):
-            for y in range(self.height):
-                location = (x, y)
-                gs = self.loc_to_gridsquare[(x, y)]
-
-                # If not collidable, add node with direction (0, 0).
-                if not gs.collidable:
-                    self.reachability_graph.add_node((location, (0, 0)))
-
-                # Add nodes for collidable gs + all edges.
-                for nav_action in World.NAV_ACTIONS:
-                    new_location = self.inbounds(location=tuple(np.asarray(location) + np.asarray(nav_action)))
-                    new_gs = self.loc_to_gridsquare[new_location]
-
-                    # If collidable, add edges for adjacent noncollidables.
-                    if gs.collidable and not new_gs.collidable:
-                        self.reachability_graph.add_node((location, nav_action))
-                        if (new_location, (0, 0)) in self.reachability_graph:
-                            self.reachability_graph.add_edge((location, nav_action),
-                                                             (new_location, (0, 0)))
-                    # If not collidable and new_gs collidable, add edge.
-                    elif not gs.collidable and new_gs.collidable:
-                        if (new_location, tuple(-np.asarray(nav_action))) in self.reachability_graph:
-                            self.reachability_graph.add_edge((location, (0, 0)),
-                                                             (new_location, tuple(-np.asarray(nav_action))))
-                    # If both not collidable, add direct edge.
-                    elif not gs.collidable and not new_gs.collidable:
-                        if (new_location, (0, 0)) in self.reachability_graph:
-                            self.reachability_graph.add_edge((location, (0, 0)), (new_location, (0, 0)))
-                    # If both collidable, add nothing.
+        collidable = np.zeros((self.width, self.height), dtype=bool)
+        for (x, y), gs in self.loc_to_gridsquare.items():
+            collidable[x, y] = gs.collidable
+        self.reachability_graph = ReachabilityGraph(collidable, World.NAV_ACTIONS)
 
         # If you want to visualize this graph, uncomment below.
+        # import networkx as nx
         # plt.figure()
-        # nx.draw(self.reachability_graph)
+        # nx.draw(self.reachability_graph.to_networkx())
         # plt.show()
 
+    def make_distances(self, locations):
+        """Set up shortest path lengths over the reachability graph.
+
+        `self.node_distances` gives distances between reachability graph
+        nodes (see NodeDistances), and `self.distances` is a
+        `distances[source][destination]` table over `locations` where each
+        location takes the closest of its approach nodes. Both run a BFS per
+        source the first time it is queried instead of precomputing all
+        pairs, and are shared by every copy of this world."""
+        self.node_distances = NodeDistances(self.reachability_graph)
+        self.distances = DistanceTable(self.reachability_graph, locations)
+
     def get_lower_bound_between(self, subtask, agent_locs, A_locs, B_locs):
-        """Return distance lower bound between subtask-relevant locations."""
+        """Return distance lower bound between subtask-relevant locations.
+
+        Results are cached in `World.lower_bound_cache` under the layout's
+        key, so every copy of a world (and every episode on the same level)
+        shares them."""
+        key = (self.layout_hash, type(subtask), tuple(agent_locs), frozenset(A_locs), frozenset(B_locs))
+        bound = World.lower_bound_cache.get(key)
+        if bound is None:
+            bound = self._get_lower_bound_between(subtask, agent_locs, A_locs, B_locs)
+            World.lower_bound_cache.put(key, bound)
+        return bound
+
+    def _get_lower_bound_between(self, subtask, agent_locs, A_locs, B_locs):
+        """Evaluates every (agent, A, B, approach edge) combination at once,
+        reading shortest path lengths from `self.node_distances`."""
         lower_bound = self.perimeter + 1
-        for A_loc, B_loc in product(A_locs, B_locs):
-            bound = self.get_lower_bound_between_helper(
-                    subtask=subtask,
-                    agent_locs=agent_locs,
-                    A_loc=A_loc,
-                    B_loc=B_loc)
-            if bound < lower_bound:
-                lower_bound = bound
-        return lower_bound
-
-    @lru_cache(maxsize=40000)
-    def get_lower_bound_between_helper(self, subtask, agent_locs, A_loc, B_loc):
-        lower_bound = self.perimeter + 1
-        A = self.get_gridsquare_at(A_loc)
-        B = self.get_gridsquare_at(B_loc)
-        A_possible_na = [(0, 0)] if not A.collidable else World.NAV_ACTIONS
-        B_possible_na = [(0, 0)] if not B.collidable else World.NAV_ACTIONS
-
-        for A_na, B_na in product(A_possible_na, B_possible_na):
-            if len(agent_locs) == 1:
-                try:
-                    bound_1 = nx.shortest_path_length(
-                            self.reachability_graph, (agent_locs[0], (0, 0)), (A_loc, A_na))
-                    bound_2 = nx.shortest_path_length(
-                            self.reachability_graph, (A_loc, A_na), (B_loc, B_na))
-                except:
-                    continue
-                bound = bound_1 + bound_2 - 1
-
-            elif len(agent_locs) == 2:
-                # Try to calculate the distances between agents and Objects A and B.
-                # Distance between Agent 1 <> Object A.
-                try:
-                    bound_1_to_A = nx.shortest_path_length(
-                            self.reachability_graph, (agent_locs[0], (0, 0)), (A_loc, A_na))
-                except:
-                    bound_1_to_A = self.perimeter
-                # Distance between Agent 2 <> Object A.
-                try:
-                    bound_2_to_A = nx.shortest_path_length(
-                            self.reachability_graph, (agent_locs[1], (0, 0)), (A_loc, A_na))
-                except:
-                    bound_2_to_A = self.perimeter
-
-                # Take the agent that's the closest to Object A.
-                min_bound_to_A = min(bound_1_to_A, bound_2_to_A)
-
-                # Distance between the agents.
-                bound_between_agents = manhattan_dist(A_loc, B_loc)
-
-                # Distance between Agent 1 <> Object B.
-                try:
-                    bound_1_to_B = nx.shortest_path_length(self.reachability_graph, (agent_locs[0], (0, 0)), (B_loc, B_na))
-                except:
-                    bound_1_to_B = self.perimeter
-
-                # Distance between Agent 2 <> Object B.
-                try:
-                    bound_2_to_B = nx.shortest_path_length(self.reachability_graph, (agent_locs[1], (0, 0)), (B_loc, B_na))
-                except:
-                    bound_2_to_B = self.perimeter
-
-                # Take the agent that's the closest to Object B.
-                min_bound_to_B = min(bound_1_to_B, bound_2_to_B)
-
-                # For chop or deliver, must bring A to B.
-                if isinstance(subtask, recipe.Chop) or isinstance(subtask, recipe.Deliver):
-                    bound = min_bound_to_A + bound_between_agents - 1
-                # For merge, agents can separately go to A and B and then meet in the middle.
-                elif isinstance(subtask, recipe.Merge):
-                    min_bound_to_A, min_bound_to_B = self.check_bound(
-                            min_bound_to_A=min_bound_to_A,
-                            min_bound_to_B=min_bound_to_B,
-                            bound_1_to_A=bound_1_to_A,
-                            bound_2_to_A=bound_2_to_A,
-                            bound_1_to_B=bound_1_to_B,
-                            bound_2_to_B=bound_2_to_B
-                            )
-                    bound = max(min_bound_to_A, min_bound_to_B) + (bound_between_agents - 1)/2
-
-            if bound < lower_bound:
-                lower_bound = bound
+        if not A_locs or not B_locs:
+            return lower_bound
+
+        # Approach nodes, shaped (num locs, 4), and which of them to consider.
+        A_nodes, A_valid = self.get_approach_nodes(A_locs)
+        B_nodes, B_valid = self.get_approach_nodes(B_locs)
+        valid = A_valid[:, :, None, None] & B_valid[None, None, :, :]
+        agent_nodes = np.array([self.reachability_graph.node_id(loc, (0, 0)) for loc in agent_locs])
+        dist = self.node_distances
+
+        # Bounds are shaped (A, A approach edge, B, B approach edge).
+        if len(agent_locs) == 1:
+            # Unreachable combinations are skipped (left at inf).
+            bound_1 = dist[agent_nodes[0], A_nodes]
+            bound_2 = dist[A_nodes[:, :, None, None], B_nodes[None, None, :, :]]
+            bounds = bound_1[:, :, None, None] + bound_2 - 1
+
+        elif len(agent_locs) == 2:
+            # Distances between each agent and Objects A and B; unreachable
+            # approach edges count as a full perimeter.
+            bound_to_A = dist[agent_nodes[:, None, None], A_nodes[None]]
+            bound_to_A = np.where(np.isinf(bound_to_A), self.perimeter, bound_to_A)
+            bound_to_B = dist[agent_nodes[:, None, None], B_nodes[None]]
+            bound_to_B = np.where(np.isinf(bound_to_B), self.perimeter, bound_to_B)
+
+            # Take the agent that's the closest to Object A (and to Object B).
+            min_bound_to_A = bound_to_A.min(axis=0)
+            min_bound_to_B = bound_to_B.min(axis=0)
+
+            # Manhattan distance between A and B.
+            A_arr, B_arr = np.asarray(A_locs), np.asarray(B_locs)
+            bound_between_agents = np.abs(A_arr[:, None, :] - B_arr[None, :, :]).sum(axis=-1)[:, None, :, None]
+
+            # For chop or deliver, must bring A to B.
+            if isinstance(subtask, recipe.Chop) or isinstance(subtask, recipe.Deliver):
+                bounds = min_bound_to_A[:, :, None, None] + bound_between_agents - 1
+            # For merge, agents can separately go to A and B and then meet in the middle.
+            elif isinstance(subtask, recipe.Merge):
+                # If the same agent is closest to both A and B, it has to do both legs.
+                same_agent = np.zeros(valid.shape, dtype=bool)
+                for i in range(2):
+                    same_agent |= ((bound_to_A[i] == min_bound_to_A)[:, :, None, None] &
+                                   (bound_to_B[i] == min_bound_to_B)[None, None, :, :])
+                to_A = np.where(same_agent, 2*min_bound_to_A[:, :, None, None], min_bound_to_A[:, :, None, None])
+                to_B = np.where(same_agent, 2*min_bound_to_B[None, None, :, :], min_bound_to_B[None, None, :, :])
+                bounds = np.maximum(to_A, to_B) + (bound_between_agents - 1)/2
+            else:
+                raise ValueError("No lower bound for subtask {}".format(subtask))
+        else:
+            raise ValueError("Can only bound 1 or 2 agents, got {}".format(len(agent_locs)))
 
+        bound = np.where(valid, bounds, np.inf).min()
+        if bound < lower_bound:
+            lower_bound = bound.item()
         return max(1, lower_bound)
 
-    def check_bound(self, min_bound_to_A, min_bound_to_B,
-                            bound_1_to_A, bound_2_to_A,
-                            bound_1_to_B, bound_2_to_B):
-        # Checking for whether it's the same agent that does the subtask.
-        if ((bound_1_to_A == min_bound_to_A and bound_1_to_B == min_bound_to_B) or
-            (bound_2_to_A == min_bound_to_A and bound_2_to_B == min_bound_to_B)):
-            return 2*min_bound_to_A, 2*min_bound_to_B
-        return min_bound_to_A, min_bound_to_B
+    def get_lower_bound_between_helper(self, subtask, agent_locs, A_loc, B_loc):
+        """Return distance lower bound for a single (A, B) pair of locations."""
+        return self.get_lower_bound_between(
+                subtask=subtask,
+                agent_locs=agent_locs,
+                A_locs=(A_loc,),
+                B_locs=(B_loc,))
+
+    def get_approach_nodes(self, locations):
+        """Return reachability graph node ids for approaching each location.
+
+        Floor squares are approached through their (0, 0) node, collidable
+        squares through one node per NAV_ACTION. Missing nodes get id -1,
+        which `self.node_distances` reports as unreachable.
+
+        Returns:
+            (ids, valid): (len(locations), 4) int and bool NumPy arrays.
+        """
+        ids = np.full((len(locations), len(World.NAV_ACTIONS)), -1)
+        valid = np.zeros(ids.shape, dtype=bool)
+        for i, loc in enumerate(locations):
+            if not self.get_gridsquare_at(loc).collidable:
+                ids[i, 0] = self.reachability_graph.node_id(loc, (0, 0))
+                valid[i, 0] = True
+            else:
+                for j, na in enumerate(World.NAV_ACTIONS):
+                    ids[i, j] = self.reachability_graph.node_id(loc, na)
+                valid[i] = True
+        return ids, valid
 
     def is_occupied(self, location):
-        o = list(filter(lambda obj: obj.location == location and
-         isinstance(obj, Object) and not(obj.is_held), self.get_object_list()))
-        if o:
-            return True
+        for obj in self.loc_to_objects.get(location, ()):
+            if not obj.is_held:
+                return True
         return False
 
     def clear_object(self, position):
@@ -224,6 +404,9 @@ class World:
 
     def insert(self, obj):
         self.objects.setdefault(obj.name, []).append(obj)
+        self._index(obj)
+        if self._token is not None:
+            obj._owner = self._token
 
     def remove(self, obj):
         num_objs = len(self.objects[obj.name])
@@ -232,8 +415,107 @@ class World:
             if self.objects[obj.name][i].location == obj.location:
                 index = i
         assert index is not None, "Could not find {}!".format(obj.name)
-        self.objects[obj.name].pop(index)
+        removed = self.objects[obj.name].pop(index)
         assert len(self.objects[obj.name]) < num_objs, "Nothing from {} was removed from world.objects".format(obj.name)
+        self._unindex(removed, removed.location)
+
+    def clear_objects(self):
+        """Removes every object (held or not) and empties the gridsquares
+        that held them. Agents' holdings are left to the caller."""
+        removed, names = set(), set()
+        for location, objs in list(self.loc_to_objects.items()):
+            gs = self.loc_to_gridsquare.get(location)
+            if gs is not None and gs.holding:
+                gs = self.own(gs, location)
+                gs.holding = [] if isinstance(gs.holding, list) else None
+            for obj in list(objs):
+                self._unindex(obj, location)
+                removed.add(id(obj))
+                names.add(obj.name)
+        for name in names:
+            self.objects[name] = [obj for obj in self.objects[name] if id(obj) not in removed]
+
+    def acquire(self, holder, obj):
+        """Has holder (gridsquare or agent) acquire obj, keeping the index in sync."""
+        changed = [obj]
+        if not isinstance(holder, GridSquare) and holder.holding is not None:
+            changed.append(holder.holding)  # merging renames what holder holds
+        changed = self._detach(changed)
+        holder.acquire(obj)
+        self._attach(changed)
+
+    def release(self, agent):
+        """Has agent release what it holds, keeping the index in sync."""
+        changed = self._detach([agent.holding])
+        agent.release()
+        self._attach(changed)
+
+    def move_to(self, agent, new_location):
+        """Moves agent (and whatever it holds), keeping the index in sync."""
+        changed = self._detach([agent.holding])
+        agent.move_to(new_location)
+        self._attach(changed)
+
+    def chop(self, obj):
+        """Chops obj, keeping the index in sync."""
+        changed = self._detach([obj])
+        obj.chop()
+        self._attach(changed)
+
+    def _index(self, obj):
+        if self._dirty is not None:
+            self._dirty.add(obj.location)
+        for ref in self._change_sets:
+            changes = ref()
+            if changes is not None:
+                changes.add(obj.location)
+        if isinstance(obj, GridSquare):
+            self.loc_to_gridsquare[obj.location] = obj
+            self.layout_hash = (self.layout_hash + zobrist((obj.name, obj.location))) & ZOBRIST_MASK
+            if not is_dynamic(obj.name):
+                return
+        elif isinstance(obj, Object):
+            self.loc_to_objects[obj.location].append(obj)
+        self.state_hash = (self.state_hash + zobrist(obj.get_repr())) & ZOBRIST_MASK
+        self._dynamic_objects = None
+
+    def _unindex(self, obj, location):
+        if self._dirty is not None:
+            self._dirty.add(location)
+        for ref in self._change_sets:
+            changes = ref()
+            if changes is not None:
+                changes.add(location)
+        if isinstance(obj, GridSquare):
+            if self.loc_to_gridsquare.get(location) is obj:
+                del self.loc_to_gridsquare[location]
+            self.layout_hash = (self.layout_hash - zobrist((obj.name, obj.location))) & ZOBRIST_MASK
+            if not is_dynamic(obj.name):
+                return
+        elif isinstance(obj, Object):
+            objs = self.loc_to_objects.get(location, [])
+            for i, o in enumerate(objs):
+                if o is obj:
+                    objs.pop(i)
+                    break
+            if not objs:
+                self.loc_to_objects.pop(location, None)
+        self.state_hash = (self.state_hash - zobrist(obj.get_repr())) & ZOBRIST_MASK
+        self._dynamic_objects = None
+
+    def _detach(self, objs):
+        """Takes the tracked objects among objs out of the index (and state
+        hash) before they are mutated. Returns them for `_attach`."""
+        detached = []
+        for obj in objs:
+            if obj is not None and any(o is obj for o in self.loc_to_objects.get(obj.location, ())):
+                self._unindex(obj, obj.location)
+                detached.append(obj)
+        return detached
+
+    def _attach(self, objs):
+        for obj in objs:
+            self._index(obj)
 
     def get_object_list(self):
         all_obs = []
@@ -243,14 +525,18 @@ class World:
 
     def get_dynamic_objects(self):
         """Get objects that can be moved."""
+        if self._dynamic_objects is not None:
+            return self._dynamic_objects
+
         objs = list()
 
         for key in sorted(self.objects.keys()):
-            if key != "Counter" and key != "Floor" and "Supply" not in key and key != "Delivery" and key != "Cutboard" and key != "Trash" and key != "FoodSpawner":
+            if is_dynamic(key):
                 objs.append(tuple(list(map(lambda o: o.get_repr(), self.objects[key]))))
 
         # Must return a tuple because this is going to get hashed.
-        return tuple(objs)
+        self._dynamic_objects = tuple(objs)
+        return self._dynamic_objects
 
     def get_collidable_objects(self):
         return list(filter(lambda o : o.collidable, self.get_object_list()))
@@ -262,7 +548,11 @@ class World:
         return list(map(lambda o: o.location, self.get_dynamic_objects()))
 
     def is_collidable(self, location):
-        return location in list(map(lambda o: o.location, list(filter(lambda o: o.collidable, self.get_object_list()))))
+        """Whether agents are blocked from entering location, from the live
+        gridsquares (so counters inserted after reset, such as the planner's
+        AgentCounters, block too); cells off the grid are."""
+        gs = self.loc_to_gridsquare.get(location)
+        return gs is None or gs.collidable
 
     def get_object_locs(self, obj, is_held):
         if obj.name not in self.objects.keys():
@@ -280,28 +570,23 @@ class World:
         return list(set(self.get_object_locs(obj=obj, is_held=True) + self.get_object_locs(obj=obj, is_held=False)))
 
     def get_object_at(self, location, desired_obj, find_held_objects):
-        # Map obj => location => filter by location => return that object.
-        all_objs = self.get_object_list()
+        # Look up objects in this cell => filter by held state (and name).
+        cell_objs = self.loc_to_objects.get(location, ())
 
         if desired_obj is None:
-            objs = list(filter(
-                lambda obj: obj.location == location and isinstance(obj, Object) and obj.is_held is find_held_objects,
-                all_objs))
+            objs = [obj for obj in cell_objs if obj.is_held is find_held_objects]
         else:
-            objs = list(filter(lambda obj: obj.name == desired_obj.name and obj.location == location and
-                isinstance(obj, Object) and obj.is_held is find_held_objects,
-                all_objs))
+            objs = [obj for obj in cell_objs if obj.name == desired_obj.name and
+                obj.is_held is find_held_objects]
 
         assert len(objs) == 1, "looking for {}, found {} at {}".format(desired_obj, ','.join(o.get_name() for o in objs), location)
 
         return objs[0]
 
     def get_gridsquare_at(self, location):
-        gss = list(filter(lambda o: o.location == location and\
-            isinstance(o, GridSquare), self.get_object_list()))
-
-        assert len(gss) == 1, "{} gridsquares at {}: {}".format(len(gss), location, gss)
-        return gss[0]
+        gs = self.loc_to_gridsquare.get(location)
+        assert gs is not None, "0 gridsquares at {}".format(location)
+        return gs
 
     def inbounds(self, location):
         """Correct locaiton to be in bounds of world object."""